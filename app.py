@@ -15,6 +15,7 @@ from telegram import (
     chat,
 )
 from telegram.ext import (
+    ExtBot,
     Updater,
     CommandHandler,
     MessageHandler,
@@ -23,30 +24,43 @@ from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
     InlineQueryHandler,
+    TypeHandler,
 )
 import logging
 import os
 import random
 import datetime
+import math
 import time
-import uuid
+import io
+import functools
+from collections import Counter
 
 from dotenv import load_dotenv
 from database import top_text, bottom_text, last_called, last_called_username
-import requests as re
-from better_profanity import profanity
-from nltk import download
-from nltk.util import ngrams
-from nltk.corpus import words
-from nltk.metrics.distance import (
-    edit_distance,
-    jaccard_distance,
-)
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud, STOPWORDS
+from lexicon import load_lexicon
+from spelling import get_corrector
+from spelling_pool import CorrectionPool
+from micro_batch import MicroBatcher
+from correction_cache import CorrectionCache
+from chat_turns import ChatTurns
+from outbox import Outbox
+from media_cache import MediaCache
+from profanity_filter import matcher_for
+from tokenizer import tokenize
+import ingress
+import sharding
+import metrics
+from write_behind import WriteBehind
+from word_clouds import WordCloudRenderer
+from profanity_times import ProfanityTimes
+from typo_stats import TypoStats
+from leaderboard import Leaderboard, TypoHistory
+from persistence import MongoPersistence
+from settings_store import SettingsStore
+from requests import RequestException
+from memes import MemeClient, MemeError
 
-download("words")  # run this in the first run
-correct_spellings = words.words()
 # typos = []
 
 from pymongo import MongoClient
@@ -88,20 +102,118 @@ markup_boolean = ReplyKeyboardMarkup(boolean_keyboard, one_time_keyboard=True)
 
 FIRST_STATE, SECOND_STATE, THIRD_STATE = range(3)
 
+LYRICS_INTERVAL = 1.5
+MAX_TOP_TYPOS = 20
+
+# Static media, sent by file_id once Telegram has fetched them (see MediaCache)
+RICKROLL_GIF = "https://c.tenor.com/x8v1oNUOmg4AAAAC/rickroll-roll.gif"
+SPOTIFY_CODE = "https://i.imgur.com/iI76wrG.jpg"
+
+with open("lyrics.txt", "r", encoding="utf-8") as file:
+    LYRICS = ["\n".join(line.strip().split("%")) for line in file if line.strip()]
+
 load_dotenv("./.env")
 TOKEN = os.getenv("token")
+# A local Bot API server, e.g. http://127.0.0.1:8081/bot; Telegram's by default
+BOT_API_URL = os.getenv("bot_api_url")
 USERNAME = os.getenv("username")
 PASSWORD = os.getenv("password")
 MONGOURL = os.getenv("mongourl")
+SPELLING_BACKEND = os.getenv("spelling_backend", "jaccard")
+# Backends a chat may pick with its spelling_backend setting, all built up front
+SPELLING_BACKENDS = tuple(
+    dict.fromkeys(
+        name.strip()
+        for name in [SPELLING_BACKEND, *os.getenv("spelling_backends", "").split(",")]
+        if name.strip()
+    )
+)
+SPELLING_WORKERS = int(os.getenv("spelling_workers", 0))
+SPELLING_QUEUE = int(os.getenv("spelling_queue", 64))
+SPELLING_TIMEOUT = float(os.getenv("spelling_timeout", 2.0))
+SPELLING_BATCH_MS = float(os.getenv("spelling_batch_ms", 0))
+SPELLING_BATCH_SIZE = int(os.getenv("spelling_batch_size", 256))
+# With batching or a spelling pool, checks run on the dispatcher's workers,
+# and only as many chats as there are workers can share a batch or keep the
+# pool busy
+WORKERS = int(
+    os.getenv("workers", 32 if SPELLING_BATCH_MS > 0 or SPELLING_WORKERS > 0 else 4)
+)
+CORRECTION_CACHE_SIZE = int(os.getenv("correction_cache_size", 50000))
+WORD_CLOUD_WIDTH = int(os.getenv("word_cloud_width", 3000))
+WORD_CLOUD_HEIGHT = int(os.getenv("word_cloud_height", 2000))
+SETTINGS_PREFETCH = int(os.getenv("settings_prefetch", 0))
+SETTINGS_PREFETCH_DAYS = float(os.getenv("settings_prefetch_days", 7))
+METRICS_LISTEN = os.getenv("metrics_listen", "127.0.0.1")
+METRICS_PORT = int(os.getenv("metrics_port", 9108))
+SHARDS = int(os.getenv("shards", 1))
+SEND_RATE = float(os.getenv("send_rate", 30))
+CHAT_SEND_RATE = float(os.getenv("chat_send_rate", 1))
+GROUP_SEND_RATE = float(os.getenv("group_send_rate", 20 / 60))
+SEND_BURST = int(os.getenv("send_burst", 3))
+SEND_WORKERS = int(os.getenv("send_workers", 4))
+SEND_MAX_PENDING = int(os.getenv("send_max_pending", 20))
+SEND_MAX_AGE = float(os.getenv("send_max_age", 60))
+SHARD_QUEUE = int(os.getenv("shard_queue", 1000))
 bot = Bot(TOKEN)
 
-client = MongoClient(MONGOURL)
-db = client.annoyme
+# Nothing below is started on import: a sharded bot's ingress process only
+# routes updates and needs none of it
+correct_spellings = None  # loaded by load_spelling()
+correction_cache = None  # started by load_spelling() unless correction_cache_size is 0
+spelling_pool = None  # started by build_updater() when spelling_workers is set
+spelling_batcher = None  # started by build_updater() when spelling_batch_ms is set
+word_cloud_renderer = None  # started by build_updater()
+outbox = None  # started by build_updater()
+chat_turns = ChatTurns()
+
+client = None  # Mongo and everything stored in it, started by start_services()
+writer = None
+settings_store = None
+media_cache = None
+profanity_times = None
+typo_history = None
+persistence = None
+meme_client = None
+
+
+def load_spelling():
+    """Map the lexicon and build every spelling backend a chat may pick."""
+    global correct_spellings, correction_cache
+    correct_spellings = load_lexicon()
+    for backend in SPELLING_BACKENDS:
+        get_corrector(backend)  # build every selectable backend up front
+    if CORRECTION_CACHE_SIZE:
+        correction_cache = CorrectionCache(CORRECTION_CACHE_SIZE)
+
+
+def start_services():
+    """Connect to Mongo and start the stores and clients the handlers use."""
+    global client, writer, settings_store, media_cache, profanity_times
+    global typo_history, persistence, meme_client
+    client = MongoClient(MONGOURL, event_listeners=[metrics.MongoListener()])
+    db = client.annoyme
+
+    settings_store = SettingsStore(db["chat_settings"])
+    media_cache = MediaCache(db["media"])
+
+    writer = WriteBehind(
+        max_pending=int(os.getenv("write_batch_size", 100)),
+        interval=float(os.getenv("write_interval", 1.0)),
+    )
+    profanity_times = ProfanityTimes(db["profanity_time"], writer, cache=last_called)
+    typo_history = TypoHistory(db["spelling"], writer)
+    persistence = MongoPersistence(
+        db["chat_data"], writer, interval=float(os.getenv("persistence_interval", 30))
+    )
+
+    meme_client = MemeClient(
+        USERNAME,
+        PASSWORD,
+        base_url=os.getenv("imgflip_url", "https://api.imgflip.com"),
+        ttl=float(os.getenv("meme_catalog_ttl", 3600)),
+    )
 
-PROFANITY_USERDB = db["profanity_user"]
-PROFANITY_TIMEDB = db["profanity_time"]
-SPELLING_ERRORDB = db["spelling"]
-SETTINGSDB = db["chat_settings"]
 
 # https://pymongo.readthedocs.io/en/stable/tutorial.html
 # PROFANITY_USERDB.insert_one({"test": 123})
@@ -120,16 +232,7 @@ def init_settings(chat_id, context):
     if "chat_settings" in context.chat_data:
         return
 
-    chat_settings = {
-        "chatid": chat_id,
-        "Spelling Hornets": True,
-        "Profanity Alert": True,
-        "wordlist": [],
-        "whitelist": [],
-    }
-
-    context.chat_data["chat_settings"] = chat_settings
-    SETTINGSDB.insert_one(chat_settings)
+    context.chat_data["chat_settings"] = settings_store.load(chat_id)
 
 
 def start(update: Update, context: CallbackContext) -> None:
@@ -146,6 +249,36 @@ To get started, type /help""",
 
 
 def message_check(update: Update, context: CallbackContext):
+    # The turn is taken here, on the dispatcher thread, so a chat's messages
+    # take effect in the order they arrived even when checks run on workers
+    turn = chat_turns.take(update.effective_chat.id)
+    if spelling_batcher is None and spelling_pool is None:
+        check_in_turn(turn, update, context)
+    else:
+        # Checks of different chats overlap, so their typos share a batch and
+        # a slow correction waits on a worker instead of the dispatcher
+        context.dispatcher.run_async(
+            check_in_turn, turn, update, context, update=update
+        )
+
+
+def check_in_turn(turn, update, context):
+    with chat_turns.wait(turn):
+        check_message(update, context)
+
+
+def in_chat_turn(handler):
+    """Run ``handler`` after the chat's earlier messages have been checked."""
+
+    @functools.wraps(handler)
+    def wrapper(update: Update, context: CallbackContext):
+        with chat_turns.turn(update.effective_chat.id):
+            return handler(update, context)
+
+    return wrapper
+
+
+def check_message(update: Update, context: CallbackContext):
     if "chat_settings" not in context.chat_data:
         init_settings(update.message.chat_id, context)
 
@@ -163,20 +296,15 @@ def message_check(update: Update, context: CallbackContext):
     msg = update.message.text
     user_id = update.effective_user.id
 
-    punc = """!()-[]{};:'"\,<>./?@#$%^&*_~"""
-    text = msg.lower()
-    for ele in text:
-        if ele in punc:
-            text = text.replace(ele, "")
-    list_words = text.split()
-
-    profanity.load_censor_words()
-    profanity.add_censor_words(blacklist)
+    tokens = tokenize(msg)
+    whitelisted = any(token.word in whitelist for token in tokens)
 
+    # Profanity matching runs on the raw text, which keeps the symbols used
+    # to disguise swear words (e.g. "@" for "a")
     if (
         profanity_on
-        and all(t not in whitelist for t in list_words)
-        and profanity.contains_profanity(msg)
+        and not whitelisted
+        and matcher_for(chat_settings).contains_profanity(msg)
     ):
 
         user_first_name = update.effective_user.first_name
@@ -186,21 +314,20 @@ def message_check(update: Update, context: CallbackContext):
         user_last_name = update.effective_user.last_name
         if user_last_name == None:
             user_last_name = " "
-        user_string = (
-            user_first_name + " (*&%^) " + user_last_name + " (*&%^) " + str(user_id)
-        )
 
         datetime_now = datetime.datetime.now()
 
-        if chat_time_storage := PROFANITY_TIMEDB.find_one(
-            {"chatid": update.message.chat_id}
+        if previous := profanity_times.record(
+            update.message.chat_id,
+            user_first_name,
+            user_last_name,
+            user_id,
+            datetime_now,
         ):
-            datetime_last_called = chat_time_storage["datetime"]
-            user_string_last_called = chat_time_storage["userstring"]
-
-            firstname_last_called = user_string_last_called.split(" (*&%^) ")[0]
-            lastname_last_called = user_string_last_called.split(" (*&%^) ")[1]
-            userid_last_called = user_string_last_called.split(" (*&%^) ")[2]
+            datetime_last_called = previous.datetime
+            firstname_last_called = previous.first_name
+            lastname_last_called = previous.last_name
+            userid_last_called = previous.user_id
 
             time_diff = str(datetime_now - datetime_last_called)
 
@@ -249,143 +376,221 @@ def message_check(update: Update, context: CallbackContext):
                 else:
                     word_input = str(num_seconds) + " seconds"
 
-            chat_time_storage["datetime"] = datetime_now
-            chat_time_storage["userstring"] = user_string
             rand_num = random.randint(0, len(word_list) - 1)
-            update.message.reply_markdown_v2(
-                fr"""🎉 *RESET THE COUNTER\!\!\!* 🎉
+            outbox.reply(
+                update.message,
+                parse_mode=ParseMode.MARKDOWN_V2,
+                text=fr"""🎉 *RESET THE COUNTER\!\!\!* 🎉
             
 It has been _{word_list[rand_num]}_ *{word_input}* since someone spewed a vulgarity here\!
 
-Previous user to spew a vulgarity: [{firstname_last_called} {lastname_last_called}](tg://user?id={userid_last_called})"""
+Previous user to spew a vulgarity: [{firstname_last_called} {lastname_last_called}](tg://user?id={userid_last_called})""",
             )
-        else:
-            chat_time_storage = {
-                "chatid": update.message.chat_id,
-                "datetime": datetime_now,
-                "userstring": user_string,
-            }
-
-        context.chat_data["chat_time_storage"] = chat_time_storage
-
-        update_obj = {"$set": chat_time_storage}
-        PROFANITY_TIMEDB.update_one(
-            {"chatid": chat_time_storage["chatid"]}, update_obj, upsert=True
-        )
 
     elif "rick" in update.message.text.lower():
         option = random.randint(0, 4)
         if option == 0:
-            update.message.reply_video(
-                "https://c.tenor.com/x8v1oNUOmg4AAAAC/rickroll-roll.gif"
+            media_cache.send(
+                functools.partial(outbox.reply, update.message, "send_animation"),
+                RICKROLL_GIF,
+                "animation",
             )
         elif option == 1:
-            update.message.reply_text(
-                "Here's a Spotify Code to help solve all your problems!\n\nDo scan it using the Spotify app on your phone!"
+            outbox.reply(
+                update.message,
+                text="Here's a Spotify Code to help solve all your problems!\n\nDo scan it using the Spotify app on your phone!",
             )
-            context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo="https://i.imgur.com/iI76wrG.jpg",
+            media_cache.send(
+                functools.partial(outbox.send, "send_photo", update.effective_chat.id),
+                SPOTIFY_CODE,
+                "photo",
             )
         elif option == 2:
-            new_list = []
-            with open("lyrics.txt", "r+", encoding="utf-8") as file:
-                new_list = file.readlines()
-                for text in new_list:
-                    words = text.split("%")
-                    sentence = ""
-                    for i in range(len(words)):
-                        sentence += words[i] + "\n"
-                    context.bot.send_message(
-                        chat_id=update.effective_chat.id, text=sentence
-                    )
-                    time.sleep(1.5)
+            context.job_queue.run_once(
+                send_lyrics, 0, context=(update.effective_chat.id, 0)
+            )
         elif option == 3:
-            update.message.reply_text(
-                "Here you go, champ! You earned this 😊\n\nbit.do/YeetYeet",
+            outbox.reply(
+                update.message,
+                text="Here you go, champ! You earned this 😊\n\nbit.do/YeetYeet",
                 disable_web_page_preview=True,
             )
         else:
-            update.message.reply_text(
-                "Hey rockstar, you earned this!\n\nhttps://tinyurl.com/hacknroll2k22",
+            outbox.reply(
+                update.message,
+                text="Hey rockstar, you earned this!\n\nhttps://tinyurl.com/hacknroll2k22",
                 disable_web_page_preview=True,
             )
 
     elif spell_on:
-        count = 0
-        typos = []
-        if not "typos" in context.chat_data:
-            context.chat_data["typos"] = {}
+        backend = chat_settings.get("spelling_backend")
+        if backend not in SPELLING_BACKENDS:
+            backend = SPELLING_BACKEND  # unset, unknown or not built here
+        user_typos = context.chat_data.setdefault("typos", {})
+        if user_id not in user_typos:
+            user_typos[user_id] = TypoStats()
+        typos = user_typos[user_id]
+        leaderboard = chat_leaderboard(context.chat_data)
+
+        misspelt = [
+            word
+            for word, isalpha in tokens
+            if isalpha and not whitelisted and word not in correct_spellings
+        ]
+        count = len(misspelt)
 
-        if user_id in context.chat_data["typos"]:
-            typos = context.chat_data["typos"][user_id]
-        else:
-            context.chat_data["typos"][user_id] = typos
-
-        for word in list_words:
-            if word.isalpha() == True and word not in correct_spellings and all(word not in whitelist for word in list_words):
-                count += 1
-                candidates = [
-                    (jaccard_distance(set(ngrams(word, 2)), set(ngrams(w, 2))), w)
-                    for w in correct_spellings
-                    if w[0] == word[0]
-                ]
-                if len(candidates) != 0:
-                    correction = sorted(candidates)[
-                        0
-                    ]  # gets most similar word based on jaccard distance
-                    typos.append(
-                        (correction[0], word)
-                    )  # adds jaccard score and original typo into list
-
-        context.chat_data["typos"][user_id] = typos
+        for word, correction in zip(
+            misspelt, correct_words(backend, misspelt)
+        ):  # gets most similar word for the chat's backend
+            typos.record(
+                word, correction[0] if correction else None
+            )  # adds jaccard score and original typo
 
         if count > 0:  # if there are errors
-            update.message.reply_text(
-                f"Your reply contained {count} typo error! Are you even trying?"
+            first_name = update.effective_user.first_name
+            leaderboard.add(user_id, count, first_name)
+            typo_history.record(update.message.chat_id, user_id, count, first_name)
+            outbox.reply(
+                update.message,
+                text=f"Your reply contained {count} typo error! Are you even trying?",
             )
-        if len(typos) > 10:
-            typos.sort(key=lambda x: x[0])
-            worst_spelt = typos[0][1]
-            update.message.reply_text(
-                f"Someone made more than 10 typos today... Your worstly spelt word is {worst_spelt}"
+        if typos.today() > 10:
+            worst_spelt = typos.worst_spelt()
+            outbox.reply(
+                update.message,
+                text=f"Someone made more than 10 typos today... Your worstly spelt word is {worst_spelt}",
             )
 
 
-def plot_cloud(wordcloud):
-    plt.figure(figsize=(40, 30))
-    plt.imshow(wordcloud)
-    plt.axis("off")
-    filename = str(uuid.uuid4().hex) + ".png"
-    plt.savefig(filename)
-    return filename
+def expire_typo_windows(context: CallbackContext):
+    """Clear the hourly typo counts that have left every user's 24h window."""
+    now = time.time()
+    for chat_id, chat_data in list(context.dispatcher.chat_data.items()):
+        with chat_turns.turn(chat_id):
+            for stats in chat_data.get("typos", {}).values():
+                stats.expire(now)
+
+
+def chat_leaderboard(chat_data):
+    """The chat's Leaderboard, seeded from the typos counted before it existed."""
+    if "leaderboard" not in chat_data:
+        typos = chat_data.get("typos", {})
+        totals = {user: stats.total for user, stats in typos.items()}
+        chat_data.setdefault("leaderboard", Leaderboard(totals))
+    return chat_data["leaderboard"]
+
+
+def correct_words(backend, words):
+    """Corrections for ``words``, None where none could be made in time."""
+    if correction_cache is None:
+        return compute_corrections(backend, words)
+    return correction_cache.correct(
+        backend,
+        words,
+        functools.partial(compute_corrections, backend),
+        correct_spellings.version,
+    )
 
 
+def compute_corrections(backend, words):
+    if spelling_batcher is not None and backend == SPELLING_BACKEND:
+        return spelling_batcher.map(words, SPELLING_TIMEOUT)
+    return correct_batch(backend, words)
+
+
+def correct_batch(backend, words):
+    if spelling_pool is None or not words:
+        return get_corrector(backend).correct_many(words)
+    return spelling_pool.correct(backend, words)
+
+
+def send_lyrics(context: CallbackContext):
+    chat_id, stanza = context.job.context
+    outbox.send("send_message", chat_id, text=LYRICS[stanza])
+
+    # Each stanza schedules the next, so no worker waits between sends
+    if stanza + 1 < len(LYRICS):
+        context.job_queue.run_once(
+            send_lyrics, LYRICS_INTERVAL, context=(chat_id, stanza + 1)
+        )
+
+
+@in_chat_turn
 def word_cloud(update: Update, context: CallbackContext):
     if not "typos" in context.chat_data:
         update.message.reply_text("All great! No Spelling erros.")
         return
 
-    update.message.reply_text("Be patient! I am generating it now!")
     typos = context.chat_data["typos"]
-    words = []
-    for w in typos.values():
-        for word in w:
-            words.append(word[1])
-
-    wordcloud = WordCloud(
-        width=3000,
-        height=2000,
-        random_state=1,
-        background_color="salmon",
-        colormap="Pastel1",
-        collocations=False,
-    ).generate(" ".join(words))
-    filename = plot_cloud(wordcloud)
-    img = open(filename, "rb")
-    update.message.reply_photo(img)
-
-    os.remove(filename)
+    counts = Counter()
+    for stats in typos.values():
+        counts.update(stats.words)
+    if not counts:
+        update.message.reply_text("All great! No Spelling erros.")
+        return
+
+    if not word_cloud_renderer.cached(counts):
+        update.message.reply_text("Be patient! I am generating it now!")
+
+    def reply(image):
+        try:
+            update.message.reply_photo(io.BytesIO(image.result()))
+        except Exception:
+            logger.exception("Failed to send word cloud")
+
+    word_cloud_renderer.render(counts).add_done_callback(reply)
+
+
+@in_chat_turn
+def most_typo(update: Update, context: CallbackContext):
+    leader = chat_leaderboard(context.chat_data).leader()
+    if leader is None:
+        update.message.reply_text("All great! No Spelling erros.")
+        return
+
+    user_id, total = leader
+    name = context.chat_data["leaderboard"].name(user_id)
+    update.message.reply_text(f"{name} has the most typos with {total} typos so far!")
+
+
+@in_chat_turn
+def top_typos(update: Update, context: CallbackContext):
+    """/top_typos [n] [days]: the chat's worst spellers, optionally over days."""
+    try:
+        k = int(context.args[0]) if context.args else 5
+        days = float(context.args[1]) if len(context.args) > 1 else None
+        if days is not None and not (math.isfinite(days) and days >= 0):
+            raise ValueError(days)
+    except ValueError:
+        update.message.reply_text("Usage: /top_typos [how many] [days]")
+        return
+    k = max(1, min(k, MAX_TOP_TYPOS))
+
+    chat_id = update.message.chat_id
+    leaderboard = chat_leaderboard(context.chat_data)
+    if days is None and len(leaderboard):
+        rows = [
+            (user, leaderboard.name(user), total) for user, total in leaderboard.top(k)
+        ]
+    else:
+        # Older typos, or ones this chat's data no longer has, come from Mongo
+        since = None
+        if days is not None:
+            try:
+                start = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+                since = datetime.datetime(start.year, start.month, start.day)
+            except OverflowError:
+                pass  # further back than any typo, so all of them
+        rows = typo_history.top(chat_id, k, since)
+
+    if not rows:
+        update.message.reply_text("All great! No Spelling erros.")
+        return
+    lines = [
+        f"{rank}. {name or user} - {total} typos"
+        for rank, (user, name, total) in enumerate(rows, 1)
+    ]
+    update.message.reply_text("Most typos:\n" + "\n".join(lines))
 
 
 def help(update: Update, context: CallbackContext):
@@ -393,6 +598,8 @@ def help(update: Update, context: CallbackContext):
         fr"""To see more *information*, type /info
 
 To *toggle the settings*, type /settings
+
+To see who makes the most *typos*, type /most\_typo or /top\_typos
     """
     )
 
@@ -468,6 +675,7 @@ def settings(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 
+@in_chat_turn
 def settings_reply(update: Update, context: CallbackContext):
     msg = update.message.text
 
@@ -511,6 +719,7 @@ def settings_reply(update: Update, context: CallbackContext):
     return FIRST_STATE
 
 
+@in_chat_turn
 def change_settings(update: Update, context: CallbackContext):
     msg = update.message.text
     opt = context.chat_data["Settings_Option"]
@@ -530,21 +739,26 @@ def change_settings(update: Update, context: CallbackContext):
         return_state = FIRST_STATE
     else:
         chat_settings[opt] = True if msg == "On" else False
+        chat_settings["version"] = chat_settings.get("version", 0) + 1
         return_state = ConversationHandler.END
 
+        writer.set(
+            settings_store.collection,
+            chat_settings["chatid"],
+            {opt: chat_settings[opt], "version": chat_settings["version"]},
+        )
+
         update.message.reply_text(
             f"Settings for {opt}: {'ON' if chat_settings[opt] else 'OFF'}",
             reply_markup=ReplyKeyboardRemove(),
         )
 
-    update_obj = {"$set": chat_settings}
-
-    SETTINGSDB.update_one({"chatid": chat_settings["chatid"]}, update_obj, upsert=True)
     context.chat_data["chat_settings"] = chat_settings
 
     return return_state
 
 
+@in_chat_turn
 def change_wordlist(update: Update, context: CallbackContext):
     msg = update.message.text
     chat_settings = context.chat_data["chat_settings"]
@@ -557,25 +771,16 @@ def change_wordlist(update: Update, context: CallbackContext):
 
         if new_list[0] in ["keep", "rep"]:
             final_list = list(set(new_list[1:]))
-            if prev_options == "Custom Blacklist":
-                if new_list[0] == "keep":
-                    final_list = list(set(chat_settings["wordlist"] + new_list[1:]))
-                    chat_settings["wordlist"] = final_list
-                else:
-                    chat_settings["wordlist"] = final_list
-            else:
-                if new_list[0] == "keep":
-                    final_list = list(set(chat_settings["whitelist"] + new_list[1:]))
-                    chat_settings["whitelist"] = final_list
-                else:
-                    chat_settings["whitelist"] = final_list
-
-            update_obj = {"$set": chat_settings}
-
-            SETTINGSDB.update_one(
-                {"chatid": chat_settings["chatid"]},
-                update_obj,
-                upsert=True,
+            field = "wordlist" if prev_options == "Custom Blacklist" else "whitelist"
+            if new_list[0] == "keep":
+                final_list = list(set(chat_settings[field] + new_list[1:]))
+            chat_settings[field] = final_list
+            chat_settings["version"] = chat_settings.get("version", 0) + 1
+
+            writer.set(
+                settings_store.collection,
+                chat_settings["chatid"],
+                {field: final_list, "version": chat_settings["version"]},
             )
 
             context.chat_data["chat_settings"] = chat_settings
@@ -622,25 +827,13 @@ def message_filter(update: Update, context: CallbackContext):
     else:
         bottom_text[chat_id] = text
 
-        data = re.get("https://api.imgflip.com/get_memes").json()["data"]["memes"]
-        image_id = random.randint(0, len(data) - 1)
-        URL = "https://api.imgflip.com/caption_image"
-
-        params = {
-            "username": USERNAME,
-            "password": PASSWORD,
-            "template_id": data[image_id]["id"],
-            "text0": top_text[chat_id],
-            "text1": bottom_text[chat_id],
-        }
-
-        response = re.request("POST", URL, params=params).json()
-        url_image = response["data"]["url"]
-
-        update.message.reply_photo(photo=url_image)
-
-        del top_text[chat_id]
-        del bottom_text[chat_id]
+        try:
+            url_image = meme_client.caption(top_text.pop(chat_id), bottom_text.pop(chat_id))
+        except (RequestException, MemeError):
+            logger.exception("Failed to generate meme")
+            update.message.reply_text("The meme machine is broken, try again later!")
+        else:
+            update.message.reply_photo(photo=url_image)
 
         return ConversationHandler.END
 
@@ -656,15 +849,75 @@ def cancel(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 
-def main():
-    updater = Updater(TOKEN, use_context=True)
+def build_updater(shard=None):
+    """Start this process's services and an Updater with every handler added.
+
+    ``shard`` is set in shard worker processes, which only see their own chats.
+    """
+    global spelling_pool, spelling_batcher, word_cloud_renderer, outbox
+    load_spelling()
+    start_services()
+    word_cloud_renderer = WordCloudRenderer(WORD_CLOUD_WIDTH, WORD_CLOUD_HEIGHT)
+    if SPELLING_WORKERS > 0:
+        spelling_pool = CorrectionPool(
+            SPELLING_WORKERS,
+            max_pending=SPELLING_QUEUE,
+            timeout=SPELLING_TIMEOUT,
+            backends=SPELLING_BACKENDS,
+        )
+    if SPELLING_BATCH_MS > 0:
+        # Typos from messages handled at the same time share one scoring pass
+        spelling_batcher = MicroBatcher(
+            functools.partial(correct_batch, SPELLING_BACKEND),
+            max_batch=SPELLING_BATCH_SIZE,
+            max_delay=SPELLING_BATCH_MS / 1000,
+        )
+
+    meme_client.refresh_in_background()
+
+    persistence.ensure_index()
+    media_cache.ensure_index()
+    typo_history.ensure_index()
+    updater = make_updater(WORKERS, persistence=persistence)
+    # Replies from message_check are queued and sent within Telegram's flood
+    # limits; shards split the bot-wide limit between them
+    outbox = Outbox(
+        updater.bot,
+        rate=SEND_RATE if shard is None else SEND_RATE / SHARDS,
+        chat_rate=CHAT_SEND_RATE,
+        group_rate=GROUP_SEND_RATE,
+        chat_burst=SEND_BURST,
+        senders=SEND_WORKERS,
+        max_pending=SEND_MAX_PENDING,
+        max_age=SEND_MAX_AGE,
+    )
 
     # Get dispatcher to register handlers
     dp = updater.dispatcher
 
-    for c in SETTINGSDB.find():
-        del c["_id"]
-        dp.chat_data[c["chatid"]]["chat_settings"] = c
+    if os.getenv("seed_profanity_times"):
+        profanity_times.seed()
+
+    # Settings are loaded per chat on first use; optionally warm up the chats
+    # that were active lately without holding up startup
+    settings_store.ensure_index()
+    if SETTINGS_PREFETCH > 0:
+        since = datetime.datetime.utcnow() - datetime.timedelta(
+            days=SETTINGS_PREFETCH_DAYS
+        )
+        settings_store.prefetch_in_background(
+            dp.chat_data,
+            lambda: [
+                chat_id
+                for chat_id in persistence.recent_chats(SETTINGS_PREFETCH, since)
+                if shard is None or sharding.shard_for(chat_id, SHARDS) == shard
+            ],
+        )
+
+    # Counts expire lazily too; the sweep keeps idle chats' saved data current
+    updater.job_queue.run_repeating(
+        expire_typo_windows, interval=3600, first=3600 - time.time() % 3600 + 1
+    )
 
     dp.add_handler(CommandHandler("start", start))
 
@@ -702,13 +955,86 @@ def main():
     dp.add_handler(settings_handler)
 
     dp.add_handler(CommandHandler("word_cloud", word_cloud))
+    dp.add_handler(CommandHandler("most_typo", most_typo))
+    dp.add_handler(CommandHandler("top_typos", top_typos))
     dp.add_handler(MessageHandler(Filters.text, message_check))
 
     unknown_handler = MessageHandler(Filters.command, unknown)
     dp.add_handler(unknown_handler)
 
-    updater.start_polling()
+    metrics.instrument_dispatcher(dp)
+    metrics.register_stats("annoyingu_write_behind", writer.stats)
+    metrics.register_stats("annoyingu_chat_data", persistence.stats)
+    metrics.register_stats("annoyingu_outbox", outbox.stats)
+    metrics.register_stats("annoyingu_media_cache", media_cache.stats)
+    if spelling_pool is not None:
+        metrics.register_stats("annoyingu_spelling_pool", spelling_pool.stats)
+    if spelling_batcher is not None:
+        metrics.register_stats("annoyingu_spelling_batch", spelling_batcher.stats)
+    metrics.register_stats("annoyingu_chat_turns", chat_turns.stats)
+    if correction_cache is not None:
+        metrics.register_stats("annoyingu_correction_cache", correction_cache.stats)
+    if METRICS_PORT:
+        # Shards serve their own metrics on the ports after the ingress's
+        port = METRICS_PORT if shard is None else METRICS_PORT + 1 + shard
+        metrics.serve(port, METRICS_LISTEN)
+
+    return updater
+
+
+def make_updater(workers=4, persistence=None):
+    """Updater whose bot times every Bot API request it makes."""
+    # Sized as Updater would size its own pool: workers, dispatcher, updater
+    request = metrics.InstrumentedRequest(con_pool_size=workers + 4)
+    bot = ExtBot(TOKEN, base_url=BOT_API_URL, request=request)
+    return Updater(
+        bot=bot, use_context=True, workers=workers, persistence=persistence
+    )
+
+
+def shutdown(updater):
+    # Save the chat data once the dispatcher is done with it. PTB's signal
+    # handler flushes before stopping the dispatcher, which misses the
+    # updates and checks that were still running
+    updater.dispatcher.update_persistence()
+    persistence.flush()
+    outbox.close()
+    writer.close()
+    word_cloud_renderer.shutdown()
+    if spelling_pool is not None:
+        spelling_pool.shutdown()
+    logger.info("Write-behind stats: %s", writer.stats())
+
+
+def run_shard(shard, updates):
+    """Entry point of a shard worker process, see main()."""
+    updater = build_updater(shard)
+    logger.info("Shard %d of %d started", shard, SHARDS)
+    sharding.serve(updater, updates)
+    shutdown(updater)
+
+
+def main():
+    ingress.webhook_config()  # fail on a bad webhook setup before starting anything
+
+    if SHARDS > 1:
+        # This process only receives updates and routes each chat to one of
+        # the shard processes, which run the handlers
+        shards = sharding.Shards(SHARDS, run_shard, queue_size=SHARD_QUEUE)
+        updater = make_updater()
+        updater.dispatcher.add_handler(TypeHandler(Update, shards.route))
+        metrics.register_stats("annoyingu_shards", shards.stats)
+        if METRICS_PORT:
+            metrics.serve(METRICS_PORT, METRICS_LISTEN)
+        ingress.start(updater)
+        updater.idle()
+        shards.close()
+        return
+
+    updater = build_updater()
+    ingress.start(updater)
     updater.idle()
+    shutdown(updater)
 
 
 if __name__ == "__main__":
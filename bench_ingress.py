@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compare update latency of long polling and webhook ingress.
+
+A local fake Telegram server emits text updates at a fixed rate, either
+answering the bot's getUpdates long polls or POSTing to its webhook, and
+the time from emitting an update to its handler running is recorded.
+
+    python bench_ingress.py --updates 500 --rate 100 --workers 4
+"""
+
+import argparse
+import socket
+import statistics
+import threading
+import time
+
+from telegram.ext import Filters, MessageHandler, Updater
+
+import ingress
+from fake_telegram import TOKEN, FakeTelegram, make_update
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(mode, updates, rate, workers):
+    server = FakeTelegram()
+    updater = Updater(TOKEN, base_url=server.base_url, workers=workers)
+
+    latencies = []
+    done = threading.Event()
+
+    def record(update, context):
+        latencies.append(time.perf_counter() - float(update.message.text))
+        if len(latencies) == updates:
+            done.set()
+
+    updater.dispatcher.add_handler(MessageHandler(Filters.text, record))
+
+    if mode == "polling":
+        updater.start_polling(timeout=10)
+    else:
+        port = free_port()
+        ingress.start_webhook(
+            updater,
+            listen="127.0.0.1",
+            port=port,
+            secret="bench",
+            url=f"http://127.0.0.1:{port}",
+        )
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for i in range(updates):
+        server.push(make_update(i + 1, repr(time.perf_counter())))
+        time.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+    done.wait(60)
+    elapsed = time.perf_counter() - start
+
+    updater.stop()
+    server.close()
+
+    latencies = [l * 1000 for l in latencies]
+    print(
+        f"{mode:>8}  handled {len(latencies)}/{updates}  "
+        f"{len(latencies) / elapsed:7.1f} updates/s  "
+        f"mean {statistics.mean(latencies):7.2f}ms  "
+        f"p50 {percentile(latencies, 50):7.2f}ms  "
+        f"p95 {percentile(latencies, 95):7.2f}ms  "
+        f"p99 {percentile(latencies, 99):7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100, help="updates per second")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=("polling", "webhook"),
+        default=["polling", "webhook"],
+    )
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        run(mode, args.updates, args.rate, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Measure the per-message cost of message_check on synthetic chat traffic.
+
+Messages are built from dictionary words with a given share of typos,
+swear words and whitelisted words, then fed to app.message_check through a
+fake Update and CallbackContext. Mongo collections are in-memory stand-ins
+and every bot call is a no-op, so only the handler's own work is timed.
+Each stage (tokenize, whitelist, profanity, lexicon lookup, correction) is
+timed separately with the same helpers the handler uses, in a pass of its
+own with corrections computed uncached. The handler as a whole is timed in
+a second pass that starts with an empty correction cache, so it only hits
+what it computed itself; --no-cache turns the cache off for comparison.
+
+    python bench_message_check.py --messages 2000 --lengths 5 20 80 --typos 0 0.1 0.3
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from fake_telegram import TOKEN
+
+os.environ.setdefault("token", TOKEN)
+
+import app
+from correction_cache import CorrectionCache
+from bench_spelling import make_typo, percentile
+from profanity_filter import matcher_for
+from leaderboard import TypoHistory
+from outbox import Outbox
+from profanity_times import ProfanityTimes
+from settings_store import DEFAULTS
+from tokenizer import tokenize
+from write_behind import WriteBehind
+
+SWEARS = ["shit", "fuck", "bastard", "damn"]
+WHITELIST = ["lol", "brb"]
+STAGES = ["tokenize", "whitelist", "profanity", "lookup", "correction", "handler"]
+
+
+class MemoryCollection:
+    """Just enough of a pymongo collection for the handler's stores."""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+
+    def create_index(self, keys, **kwargs):
+        pass
+
+    def find_one(self, query, projection=None):
+        doc = self.docs.get(tuple(sorted(query.items())))
+        return dict(doc) if doc else None
+
+    def find_one_and_update(self, query, update, upsert=False, **kwargs):
+        key = tuple(sorted(query.items()))
+        if key not in self.docs and upsert:
+            self.docs[key] = dict(query, **update.get("$setOnInsert", {}))
+        doc = self.docs.get(key)
+        if doc is not None:
+            doc.update(update.get("$set", {}))
+        return dict(doc) if doc else None
+
+    def find(self, query=None, projection=None):
+        return [dict(doc) for doc in self.docs.values()]
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            key = tuple(sorted(request._filter.items()))
+            doc = self.docs.setdefault(key, dict(request._filter))
+            doc.update(request._doc.get("$set", {}))
+            for field, value in request._doc.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + value
+
+
+class MemoryClient:
+    """Stands in for MongoClient; every database and collection is in memory."""
+
+    def __init__(self, *args, **kwargs):
+        self.collections = {}
+
+    def __getattr__(self, database):
+        return self
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, MemoryCollection(name))
+
+
+class NoopBot:
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls += 1
+
+        return call
+
+
+def make_corpus(
+    lexicon,
+    count,
+    length,
+    typo_rate,
+    swear_rate,
+    whitelist_rate,
+    seed,
+    vocabulary=0,
+    variants=0,
+):
+    """Messages of ``length`` words; ``variants`` caps the misspellings per word."""
+    rng = random.Random(seed)
+    pool = [
+        w
+        for w in lexicon.words
+        if w.isalpha() and w.islower() and 2 < len(w) < 12 and "rick" not in w
+    ]
+    if vocabulary:
+        pool = rng.sample(pool, min(vocabulary, len(pool)))
+    misspellings = {}
+    messages = []
+    for _ in range(count):
+        words = []
+        for _ in range(length):
+            word = rng.choice(pool)
+            if rng.random() < typo_rate:
+                if variants:
+                    typos = misspellings.setdefault(word, [])
+                    if len(typos) < variants:
+                        typos.append(make_typo(word, rng, 1))
+                    typo = rng.choice(typos)
+                else:
+                    typo = make_typo(word, rng, 1)
+                word = typo if typo not in lexicon else word
+            words.append(word)
+        if rng.random() < swear_rate:
+            words[rng.randrange(length)] = rng.choice(SWEARS)
+        if rng.random() < whitelist_rate:
+            words[rng.randrange(length)] = rng.choice(WHITELIST)
+        if words:
+            words[0] = words[0].capitalize()
+        messages.append(" ".join(words) + rng.choice([".", "!", "?", ""]))
+    return messages
+
+
+def fake_update(message_id, text, chat_id, user_id):
+    user = SimpleNamespace(id=user_id, first_name=f"User{user_id}", last_name=None)
+    message = SimpleNamespace(
+        message_id=message_id,
+        text=text,
+        chat_id=chat_id,
+        chat=SimpleNamespace(id=chat_id, type="group"),
+    )
+    return SimpleNamespace(
+        message=message,
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=chat_id),
+    )
+
+
+def run(messages, chats, users, seed, cache):
+    rng = random.Random(seed)
+    traffic = [
+        (message_id, text, rng.randrange(-chats, 0), rng.randrange(users))
+        for message_id, text in enumerate(messages, 1)
+    ]
+    bot = NoopBot()
+    writer = WriteBehind()
+    app.profanity_times = ProfanityTimes(MemoryCollection("profanity_time"), writer)
+    app.typo_history = TypoHistory(MemoryCollection("spelling"), writer)
+    # Replies are still queued by the handler, but never held back
+    app.outbox = Outbox(bot, rate=1e9, chat_rate=1e9, group_rate=1e9, chat_burst=1e9)
+    chat_data = {
+        chat_id: {"chat_settings": dict(DEFAULTS, chatid=chat_id, whitelist=WHITELIST)}
+        for chat_id in range(-chats, 0)
+    }
+
+    timings = {stage: [] for stage in STAGES}
+    for message_id, text, chat_id, user_id in traffic:
+        settings = chat_data[chat_id]["chat_settings"]
+
+        t0 = time.perf_counter()
+        tokens = tokenize(text)
+        t1 = time.perf_counter()
+        whitelisted = any(token.word in settings["whitelist"] for token in tokens)
+        t2 = time.perf_counter()
+        matcher_for(settings).contains_profanity(text)
+        t3 = time.perf_counter()
+        misspelt = [
+            word
+            for word, isalpha in tokens
+            if isalpha and not whitelisted and word not in app.correct_spellings
+        ]
+        t4 = time.perf_counter()
+        app.compute_corrections(app.SPELLING_BACKEND, misspelt)
+        t5 = time.perf_counter()
+
+        for stage, elapsed in zip(
+            STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)
+        ):
+            timings[stage].append(elapsed * 1e6)
+
+    app.correction_cache = CorrectionCache(app.CORRECTION_CACHE_SIZE) if cache else None
+    start_all = time.perf_counter()
+    for message_id, text, chat_id, user_id in traffic:
+        context = SimpleNamespace(chat_data=chat_data[chat_id], bot=bot, job_queue=bot)
+        t0 = time.perf_counter()
+        app.message_check(fake_update(message_id, text, chat_id, user_id), context)
+        timings["handler"].append((time.perf_counter() - t0) * 1e6)
+    handler_total = sum(timings["handler"]) / 1e6
+    elapsed_all = time.perf_counter() - start_all
+
+    app.outbox.close()
+    writer.close()
+    return timings, len(messages) / handler_total, elapsed_all, bot.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument(
+        "--lengths", type=int, nargs="+", default=[5, 20, 80], help="words per message"
+    )
+    parser.add_argument(
+        "--typos", type=float, nargs="+", default=[0.0, 0.1, 0.3], help="typo share"
+    )
+    parser.add_argument("--swears", type=float, default=0.02)
+    parser.add_argument("--whitelisted", type=float, default=0.02)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument(
+        "--vocabulary",
+        type=int,
+        default=0,
+        help="draw words from this many (default: the whole lexicon)",
+    )
+    parser.add_argument(
+        "--typo-variants",
+        type=int,
+        default=0,
+        help="misspell each word in at most this many ways (default: any)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="time the handler without the cache"
+    )
+    args = parser.parse_args()
+
+    app.load_spelling()
+    lexicon = app.correct_spellings
+    cache = not args.no_cache and app.CORRECTION_CACHE_SIZE > 0
+    print(
+        f"backend {app.SPELLING_BACKEND}, {args.messages} messages per corpus, "
+        f"correction cache {'on' if cache else 'off'}"
+    )
+    for length in args.lengths:
+        for typo_rate in args.typos:
+            messages = make_corpus(
+                lexicon,
+                args.messages,
+                length,
+                typo_rate,
+                args.swears,
+                args.whitelisted,
+                args.seed,
+                args.vocabulary,
+                args.typo_variants,
+            )
+            timings, rate, elapsed, replies = run(
+                messages, args.chats, args.users, args.seed, cache
+            )
+            print(
+                f"\n{length} words, {typo_rate:.0%} typos: "
+                f"{rate:8.0f} msgs/s through message_check, "
+                f"{replies} replies, {elapsed:.1f}s"
+            )
+            if cache:
+                stats = app.correction_cache.stats()
+                lookups = stats["hits"] + stats["misses"]
+                print(f"  cache hit rate {stats['hits'] / max(1, lookups):.0%}")
+            for stage in STAGES:
+                values = timings[stage]
+                print(
+                    f"  {stage:>10}  mean {statistics.mean(values):9.1f}us  "
+                    f"p50 {percentile(values, 50):9.1f}us  "
+                    f"p95 {percentile(values, 95):9.1f}us  "
+                    f"p99 {percentile(values, 99):9.1f}us"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Measure update throughput with chats sharded across worker processes.
+
+A local fake Telegram server queues text updates from many chats; one
+ingress Updater polls it and routes every update to a shard process by
+chat, as app.py does with ``shards`` set. Each shard runs app.run_shard,
+the real handlers included, with Mongo replaced by an in-memory stand-in
+and flood limits lifted. Every update carries one typo, so each earns a
+reply; reports the throughput per shard count and checks that every
+chat's replies reached Telegram in the order its updates were sent.
+
+    python bench_shards.py --updates 2000 --chats 200 --shards 1 2 4
+"""
+
+import argparse
+import functools
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler, Updater
+
+import sharding
+from bench_spelling import make_typo
+from fake_telegram import TOKEN, FakeTelegram, make_update
+from lexicon import load_lexicon
+
+# Read by app in every shard process, which is spawned with this environment
+BENCH_ENV = {
+    "token": TOKEN,
+    "metrics_port": "0",
+    "send_rate": "1e9",
+    "chat_send_rate": "1e9",
+    "group_send_rate": "1e9",
+    "send_burst": "1000000",
+}
+
+
+def shard_worker(results, shard, updates):
+    """Shard process: app.run_shard against the fake server and in-memory Mongo."""
+    import logging
+
+    import app
+    from bench_message_check import MemoryClient
+
+    logging.getLogger("memes").setLevel(logging.CRITICAL)  # imgflip is not faked
+    app.MongoClient = MemoryClient
+    app.load_spelling()  # built before the clock starts; run_shard reuses it
+    results.put(("ready", shard))
+    app.run_shard(shard, updates)
+
+
+def make_updates(count, chats, seed):
+    rng = random.Random(seed)
+    lexicon = load_lexicon()
+    words = [w for w in lexicon.words if w.isalpha() and len(w) > 4]
+    sequence = {}
+    updates = []
+    for i in range(count):
+        chat_id = -1000 - rng.randrange(chats)
+        seq = sequence[chat_id] = sequence.get(chat_id, -1) + 1
+        typo = make_typo(rng.choice(words).lower(), rng, 1)
+        while typo in lexicon:
+            typo = make_typo(rng.choice(words).lower(), rng, 1)
+        updates.append(make_update(i + 1, f"{seq} {typo}", chat_id=chat_id))
+    return updates
+
+
+class Replies:
+    """Watches the fake server's sends: replies per chat, in arrival order."""
+
+    def __init__(self, server):
+        self.replied = {}  # chat id -> ids of the messages replied to, in order
+        self.out_of_order = 0
+        self._count = 0
+        self._cond = threading.Condition()
+        self._call = server.call
+        server.call = self.call
+
+    def call(self, method, params):
+        reply_to = params.get("reply_to_message_id")
+        if method == "sendMessage" and reply_to is not None:
+            chat_id, reply_to = int(params["chat_id"]), int(reply_to)
+            with self._cond:
+                replied = self.replied.setdefault(chat_id, [])
+                if replied and reply_to < replied[-1]:
+                    self.out_of_order += 1
+                if reply_to not in replied[-1:]:
+                    replied.append(reply_to)
+                    self._count += 1
+                    self._cond.notify_all()
+        return self._call(method, params)
+
+    def wait(self, count, timeout):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._count >= count, timeout)
+
+
+def run(shards, updates):
+    server = FakeTelegram()
+    replies = Replies(server)
+    results = multiprocessing.get_context("spawn").Queue()
+    os.environ["bot_api_url"] = server.base_url  # read by app in the shards
+    workers = sharding.Shards(shards, functools.partial(shard_worker, results))
+    for _ in range(shards):
+        results.get()
+
+    ingress = Updater(TOKEN, base_url=server.base_url, workers=1)
+    ingress.dispatcher.add_handler(TypeHandler(Update, workers.route))
+    start = time.perf_counter()
+    for update in updates:
+        server.push(update)
+    ingress.start_polling(timeout=10)
+    replies.wait(len(updates), timeout=600)
+    elapsed = time.perf_counter() - start
+    ingress.stop()
+    workers.close()
+    server.close()
+
+    handled = sum(len(replied) for replied in replies.replied.values())
+    print(
+        f"{shards:>2} shards  handled {handled}/{len(updates)}  "
+        f"{handled / elapsed:8.1f} updates/s  "
+        f"chats {len(replies.replied)}  out of order {replies.out_of_order}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", default="jaccard")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(BENCH_ENV, spelling_backend=args.backend)
+    updates = make_updates(args.updates, args.chats, args.seed)
+    for shards in args.shards:
+        run(shards, updates)
+
+
+if __name__ == "__main__":
+    main()
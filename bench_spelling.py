@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Compare the spelling correction backends on latency and suggestion quality.
+
+Typos are generated from random dictionary words with one or two random
+edits, and a suggestion counts as a hit when it recovers the original word.
+With ``--batch N`` typos are corrected N at a time through ``correct_many``
+and latencies are per word.
+
+    python bench_spelling.py --samples 500 --backends jaccard symspell
+    python bench_spelling.py --samples 2000 --backends jaccard vector --batch 64
+"""
+
+import argparse
+import random
+import statistics
+import string
+import time
+
+from lexicon import load_lexicon
+from spelling import BACKENDS
+
+
+def make_typo(word, rng, edits):
+    chars = list(word)
+    for _ in range(edits):
+        op = rng.randrange(4)
+        i = rng.randrange(len(chars))
+        if op == 0:
+            chars[i] = rng.choice(string.ascii_lowercase)
+        elif op == 1 and len(chars) > 2:
+            del chars[i]
+        elif op == 2:
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+
+def make_samples(lexicon, count, seed):
+    rng = random.Random(seed)
+    pool = [w for w in lexicon.words if w.isalpha() and w.islower() and len(w) > 3]
+    samples = []
+    while len(samples) < count:
+        word = rng.choice(pool)
+        typo = make_typo(word, rng, rng.choice((1, 1, 2)))
+        if typo not in lexicon:
+            samples.append((typo, word))
+    return samples
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(backend, samples, batch=1):
+    start = time.perf_counter()
+    corrector = BACKENDS[backend]()
+    build = time.perf_counter() - start
+
+    latencies = []
+    corrections = []
+    for i in range(0, len(samples), batch):
+        typos = [typo for typo, _ in samples[i : i + batch]]
+        start = time.perf_counter()
+        corrections += corrector.correct_many(typos)
+        latencies += [(time.perf_counter() - start) * 1000 / len(typos)] * len(typos)
+
+    hits = misses = 0
+    for (typo, word), correction in zip(samples, corrections):
+        if correction is None:
+            misses += 1
+        elif correction[1].casefold() == word:
+            hits += 1
+
+    print(
+        f"{backend:>10}  build {build:6.2f}s  "
+        f"mean {statistics.mean(latencies):7.3f}ms  "
+        f"p50 {percentile(latencies, 50):7.3f}ms  "
+        f"p95 {percentile(latencies, 95):7.3f}ms  "
+        f"p99 {percentile(latencies, 99):7.3f}ms  "
+        f"hit {hits / len(samples):6.1%}  "
+        f"no suggestion {misses / len(samples):6.1%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=1, help="typos per call")
+    parser.add_argument(
+        "--backends", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS)
+    )
+    args = parser.parse_args()
+
+    samples = make_samples(load_lexicon(), args.samples, args.seed)
+    for backend in args.backends:
+        run(backend, samples, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Compare cold start of the nltk corpus path and the mapped lexicon artifact.
+
+Each run starts a fresh interpreter that loads the lexicon and the Jaccard
+corrector and answers one correction, then reports the elapsed time and the
+resident set size it ended with. Build the artifact first:
+
+    python build_lexicon.py && python bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from lexicon import DEFAULT_PATH
+
+CHILD = """
+import json, resource, time
+start = time.perf_counter()
+from lexicon import load_lexicon
+from spelling import get_corrector
+lexicon = load_lexicon()
+corrector = get_corrector("jaccard")
+corrector.correct("helo")
+elapsed = time.perf_counter() - start
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * resource.getpagesize()
+print(json.dumps({
+    "seconds": elapsed,
+    "rss": rss,
+    "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    "lexicon": type(lexicon).__name__,
+}))
+"""
+
+
+def run(lexicon_path):
+    env = dict(os.environ, lexicon_path=lexicon_path)
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--artifact", default=os.getenv("lexicon_path") or DEFAULT_PATH)
+    args = parser.parse_args()
+
+    modes = {"corpus": os.devnull, "artifact": args.artifact}
+    for mode, path in modes.items():
+        results = [run(path) for _ in range(args.runs)]
+        mib = 2**20
+        print(
+            f"{mode:>8} ({results[0]['lexicon']})  "
+            f"startup {statistics.median(r['seconds'] for r in results) * 1000:7.1f}ms  "
+            f"rss {statistics.median(r['rss'] for r in results) / mib:6.1f} MiB  "
+            f"peak {statistics.median(r['peak_rss'] for r in results) / mib:6.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Compile the nltk word list and its correction index into a lexicon artifact.
+
+Run this once per deployment (or whenever the corpus changes); the bot maps
+the result at startup instead of downloading and parsing the corpus.
+
+    python build_lexicon.py --output lexicon.bin
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from lexicon import DEFAULT_PATH, build_lexicon, load_lexicon, write_artifact
+from spelling import JaccardCorrector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=os.getenv("lexicon_path") or DEFAULT_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    lexicon = build_lexicon()
+    sections = lexicon.sections()
+    sections.update(JaccardCorrector(lexicon).sections())
+    write_artifact(args.output, bytes.fromhex(lexicon.version), sections)
+    elapsed = time.perf_counter() - start
+
+    mapped = load_lexicon(args.output)
+    assert mapped.version == lexicon.version and len(mapped) == len(lexicon)
+    print(
+        f"wrote {args.output}: {len(lexicon)} words, "
+        f"{os.path.getsize(args.output) / 2**20:.1f} MiB, version {lexicon.version[:12]} "
+        f"in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
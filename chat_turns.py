@@ -0,0 +1,50 @@
+import threading
+from contextlib import contextmanager
+
+
+class ChatTurns:
+    """Lets the work on each chat run one piece at a time, in order.
+
+    ``take`` hands out the chat's next turn, on the dispatcher thread as an
+    update arrives; ``wait`` blocks until every earlier turn of the chat has
+    finished, wherever it runs. Handlers of different chats never wait for
+    each other, so checks can run on several workers while each chat's
+    messages still update its data and get their replies in the order they
+    were sent.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chats = {}  # chat id -> [next turn to hand out, turn now running]
+
+    def take(self, chat_id):
+        with self._cond:
+            chat = self._chats.setdefault(chat_id, [0, 0])
+            chat[0] += 1
+            return chat_id, chat[0] - 1
+
+    @contextmanager
+    def wait(self, turn):
+        chat_id, number = turn
+        with self._cond:
+            chat = self._chats[chat_id]
+            self._cond.wait_for(lambda: chat[1] == number)
+        try:
+            yield
+        finally:
+            with self._cond:
+                chat[1] += 1
+                if chat[1] == chat[0]:
+                    del self._chats[chat_id]  # nothing else queued for the chat
+                self._cond.notify_all()
+
+    def turn(self, chat_id):
+        """Take the chat's next turn and wait for it."""
+        return self.wait(self.take(chat_id))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "chats": len(self._chats),
+                "pending": sum(taken - done for taken, done in self._chats.values()),
+            }
@@ -0,0 +1,80 @@
+import threading
+
+from cachetools import LRUCache
+
+_MISSING = object()
+
+
+class _CountingLRU(LRUCache):
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class CorrectionCache:
+    """Process-wide LRU of ``(backend, token) -> (score, correction)``.
+
+    Shared by every chat: a correction depends only on the token, the
+    backend and the lexicon, never on chat settings, and whitelisted tokens
+    are dropped before they get here. Entries belong to one lexicon
+    ``version``; asking with another version empties the cache first.
+    Tokens without a correction (or whose correction timed out) are not
+    cached.
+    """
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self._entries = _CountingLRU(maxsize)
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def correct(self, backend, words, compute, version):
+        """Corrections for ``words``, calling ``compute(uncached)`` for the rest."""
+        with self._lock:
+            if version != self._version:
+                self._invalidate(version)
+            results = [self._entries.get((backend, w), _MISSING) for w in words]
+            misses = results.count(_MISSING)
+            self._counters["hits"] += len(results) - misses
+            self._counters["misses"] += misses
+        if not misses:
+            return results
+
+        uncached = list(
+            dict.fromkeys(w for w, r in zip(words, results) if r is _MISSING)
+        )
+        computed = dict(zip(uncached, compute(uncached)))
+        with self._lock:
+            if version == self._version:
+                for word, correction in computed.items():
+                    if correction is not None:
+                        self._entries[(backend, word)] = correction
+        return [computed[w] if r is _MISSING else r for w, r in zip(words, results)]
+
+    def invalidate(self, version=None):
+        """Drop every entry, e.g. after the lexicon was rebuilt."""
+        with self._lock:
+            self._invalidate(version)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                evictions=self._entries.evictions,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+            )
+
+    def _invalidate(self, version):
+        # A fresh LRU, as clear() would count every entry as an eviction
+        entries = _CountingLRU(self.maxsize)
+        entries.evictions = self._entries.evictions
+        self._entries = entries
+        if self._version is not None:
+            self._counters["invalidations"] += 1
+        self._version = version
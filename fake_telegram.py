@@ -0,0 +1,173 @@
+"""A local stand-in for the Telegram Bot API, used by the benchmarks.
+
+It answers the handful of methods the bot calls, hands queued updates to
+``getUpdates`` long polls, or POSTs them to the webhook registered with
+``setWebhook``. Point an ``Updater`` at it with ``base_url=server.base_url``.
+"""
+
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+TOKEN = "123456:FAKE-telegram-token"
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+
+def make_update(update_id, text, chat_id=-1000, user_id=1, first_name="Tester"):
+    """A minimal text message update."""
+    user = {"id": user_id, "is_bot": False, "first_name": first_name}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "group", "title": "Bench"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(command)}
+        ]
+    return {"update_id": update_id, "message": message}
+
+
+class BadRequest(Exception):
+    """Answered as a 400, like Telegram's ``Bad Request: ...`` errors."""
+
+
+class FakeTelegram:
+    def __init__(self, host="127.0.0.1"):
+        self._updates = []
+        self._file_kinds = {}  # file_id -> the kind of media it was sent as
+        self._cond = threading.Condition()
+        self._webhook = None
+        self._outbox = queue.Queue()
+        self._message_ids = itertools.count(1)
+        self.calls = {}
+
+        self._server = ThreadingHTTPServer((host, 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://{host}:{self._server.server_port}/bot"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._deliver, daemon=True).start()
+
+    def push(self, update):
+        """Make ``update`` available to the bot."""
+        if self._webhook:
+            self._outbox.put(update)
+        else:
+            with self._cond:
+                self._updates.append(update)
+                self._cond.notify_all()
+
+    def close(self):
+        self._outbox.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def call(self, method, params):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self._get_updates(
+                int(params.get("offset") or 0), float(params.get("timeout") or 0)
+            )
+        if method == "setWebhook":
+            self._webhook = params.get("url") or None
+            return True
+        if method == "deleteWebhook":
+            self._webhook = None
+            return True
+        if method.startswith("send") or method == "getChatMember":
+            message = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "group"},
+                "text": params.get("text", ""),
+                "status": "member",
+                "user": BOT_USER,
+            }
+            if method in ("sendPhoto", "sendVideo", "sendAnimation"):
+                message.update(self._media(method[4:].lower(), params))
+            return message
+        return True
+
+    def _media(self, kind, params):
+        # Media sent by URL gets a file_id; one sent by file_id keeps it, and
+        # only goes through the method it was first sent with
+        media = params.get(kind) or ""
+        if media.startswith("file-"):
+            if self._file_kinds.get(media) != kind:
+                raise BadRequest("Bad Request: type of file mismatch")
+            file_id = media
+        else:
+            file_id = f"file-{kind}-{media}"
+            self._file_kinds[file_id] = kind
+        size = {"file_id": file_id, "file_unique_id": file_id}
+        if kind == "photo":
+            return {"photo": [dict(size, width=320, height=320)]}
+        if kind == "video":
+            return {"video": dict(size, width=320, height=320, duration=5)}
+        # GIFs come back as an animation, and as a document for older clients
+        return {
+            "animation": dict(size, width=320, height=320, duration=5),
+            "document": dict(size, file_name="animation.gif.mp4"),
+        }
+
+    def _get_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0:
+                    return list(self._updates)
+                self._cond.wait(remaining)
+
+    def _deliver(self):
+        while (update := self._outbox.get()) is not None:
+            request = urllib.request.Request(
+                self._webhook,
+                data=json.dumps(update).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            urllib.request.urlopen(request, timeout=10).read()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1].split("?", 1)[0]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or b"{}")
+                else:
+                    params = dict(parse_qsl(body.decode(errors="replace")))
+                try:
+                    status = 200
+                    reply = {"ok": True, "result": fake.call(method, params)}
+                except BadRequest as e:
+                    status = 400
+                    reply = {"ok": False, "error_code": 400, "description": str(e)}
+                payload = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
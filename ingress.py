@@ -0,0 +1,56 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_config():
+    """start_webhook's arguments from .env, or None in polling ``mode``.
+
+    Raises ValueError if webhook mode is missing a setting, so the bot can
+    check this before it starts anything.
+    """
+    if os.getenv("mode", "polling") != "webhook":
+        return None
+    secret, url = os.getenv("webhook_secret"), os.getenv("webhook_url")
+    if not secret:
+        raise ValueError("webhook mode needs webhook_secret, the webhook's path")
+    if not url:
+        raise ValueError("webhook mode needs webhook_url, the public URL of the bot")
+    return {
+        "listen": os.getenv("webhook_listen", "127.0.0.1"),
+        "port": int(os.getenv("webhook_port", 8443)),
+        "secret": secret,
+        "url": url,
+        "max_connections": int(os.getenv("webhook_max_connections", 40)),
+    }
+
+
+def start(updater):
+    """Start receiving updates using the ``mode`` configured in .env."""
+    config = webhook_config()
+    if config:
+        start_webhook(updater, **config)
+    else:
+        updater.start_polling()
+
+
+def start_webhook(updater, listen, port, secret, url, max_connections=40):
+    """Serve Telegram's webhook calls on ``listen:port/secret``.
+
+    ``url`` is the public base URL Telegram should call (e.g. behind a
+    reverse proxy terminating TLS); the secret path is appended to it. It
+    is required: without it PTB would register the local ``listen:port``,
+    which Telegram cannot reach.
+    """
+    if not url:
+        raise ValueError("webhook mode needs webhook_url, the public URL of the bot")
+    webhook_url = f"{url.rstrip('/')}/{secret}"
+    logger.info("Serving webhook on %s:%d", listen, port)
+    updater.start_webhook(
+        listen=listen,
+        port=port,
+        url_path=secret,
+        webhook_url=webhook_url,
+        max_connections=max_connections,
+    )
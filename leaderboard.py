@@ -0,0 +1,107 @@
+import datetime
+import heapq
+
+from pymongo import ASCENDING
+
+
+class Leaderboard:
+    """Typo totals per user of one chat, ranked as they are counted.
+
+    Every ``add`` pushes the user's new total onto a max-heap and leaves the
+    old entry behind; stale entries are skipped when they surface and the
+    heap is rebuilt once they outnumber the users. Counting and reading the
+    leader are O(log n) amortized, the top ``k`` O(k log n). Small enough
+    to live in chat_data.
+    """
+
+    __slots__ = ("totals", "names", "_heap")
+
+    def __init__(self, totals=None):
+        self.totals = dict(totals or {})
+        self.names = {}
+        self._heap = [(-total, user_id) for user_id, total in self.totals.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, user_id, count=1, name=None):
+        """Count ``count`` more typos for ``user_id`` and return the new total."""
+        total = self.totals[user_id] = self.totals.get(user_id, 0) + count
+        if name:
+            self.names[user_id] = name
+        heapq.heappush(self._heap, (-total, user_id))
+        if len(self._heap) > 2 * len(self.totals) + 16:
+            self._heap = [(-t, u) for u, t in self.totals.items()]
+            heapq.heapify(self._heap)
+        return total
+
+    def leader(self):
+        """``(user_id, total)`` of the user with the most typos, or None."""
+        top = self.top(1)
+        return top[0] if top else None
+
+    def top(self, k):
+        """Up to ``k`` ``(user_id, total)`` pairs, most typos first."""
+        heap, found = self._heap, []
+        while heap and len(found) < k:
+            total, user_id = heapq.heappop(heap)
+            if self.totals.get(user_id) == -total and (user_id, -total) not in found:
+                found.append((user_id, -total))
+        for user_id, total in found:
+            heapq.heappush(heap, (-total, user_id))
+        return found
+
+    def name(self, user_id):
+        return self.names.get(user_id, str(user_id))
+
+    def __len__(self):
+        return len(self.totals)
+
+
+class TypoHistory:
+    """Daily typo counts per user and chat in Mongo, for queries over time.
+
+    Counts are ``$inc``-ed through the write-behind ``writer``, one document
+    per chat, user and day, and summed by an aggregation on demand.
+    """
+
+    def __init__(self, collection, writer):
+        self._collection = collection
+        self._writer = writer
+
+    def ensure_index(self):
+        self._collection.create_index(
+            [("chatid", ASCENDING), ("day", ASCENDING), ("userid", ASCENDING)],
+            unique=True,
+        )
+
+    def record(self, chat_id, user_id, count, name=None, when=None):
+        when = when or datetime.datetime.utcnow()
+        day = datetime.datetime(when.year, when.month, when.day)
+        self._writer.inc(
+            self._collection,
+            {"chatid": chat_id, "day": day, "userid": user_id},
+            {"count": count},
+            {"name": name} if name else None,
+        )
+
+    def top(self, chat_id, k, since=None):
+        """``(user_id, name, total)`` for the ``k`` users with the most typos."""
+        match = {"chatid": chat_id}
+        if since is not None:
+            match["day"] = {"$gte": since}
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"day": ASCENDING}},
+            {
+                "$group": {
+                    "_id": "$userid",
+                    "total": {"$sum": "$count"},
+                    "name": {"$last": "$name"},
+                }
+            },
+            {"$sort": {"total": -1, "_id": 1}},
+            {"$limit": k},
+        ]
+        return [
+            (doc["_id"], doc.get("name"), doc["total"])
+            for doc in self._collection.aggregate(pipeline)
+        ]
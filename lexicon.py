@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections.abc import Sequence
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon.bin")
+
+# Artifact layout: header, section table, then 8-byte aligned sections.
+# Integers are little-endian; sections are mapped with memoryview.cast, so
+# the artifact is only used on little-endian hosts.
+MAGIC = b"AULEX\x00\x00\x00"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sII20s")  # magic, format version, sections, digest
+_SECTION = struct.Struct("<16sQQ")  # name, offset, length
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _pack_strings(strings):
+    """UTF-8 blob plus ``uint32`` offsets, one more than there are strings."""
+    blob = bytearray()
+    offsets = [0]
+    for s in strings:
+        blob += s if isinstance(s, bytes) else s.encode()
+        offsets.append(len(blob))
+    return bytes(blob), struct.pack(f"<{len(offsets)}I", *offsets)
+
+
+class Strings(Sequence):
+    """Read-only sequence over a packed string blob, decoded on access."""
+
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+
+
+class Artifact:
+    """A memory-mapped lexicon artifact written by ``write_artifact``.
+
+    Sections are exposed as zero-copy memoryviews over the mapping, so every
+    process that opens the same file shares its pages.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise ArtifactError("lexicon artifacts are little-endian only")
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ArtifactError(f"{path} is truncated ({size} bytes)")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, version, count, digest = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ArtifactError(f"{path} is not a lexicon artifact")
+        if version != FORMAT_VERSION:
+            raise ArtifactError(
+                f"{path} has format {version}, expected {FORMAT_VERSION}"
+            )
+        if _HEADER.size + count * _SECTION.size > size:
+            raise ArtifactError(f"{path} is truncated in its section table")
+        self.path = path
+        self.version = digest.hex()
+        self.sections = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(
+                view, _HEADER.size + i * _SECTION.size
+            )
+            try:
+                name = name.rstrip(b"\x00").decode()
+            except UnicodeDecodeError:
+                raise ArtifactError(f"{path} has a bad section name") from None
+            if offset + length > size:
+                raise ArtifactError(f"{path} is truncated in section {name}")
+            self.sections[name] = view[offset : offset + length]
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def section(self, name):
+        try:
+            return self.sections[name]
+        except KeyError:
+            raise ArtifactError(f"{self.path} has no {name} section") from None
+
+    def array(self, name, fmt="I"):
+        try:
+            return self.section(name).cast(fmt)
+        except TypeError:
+            raise ArtifactError(
+                f"{self.path} has a misaligned {name} section"
+            ) from None
+
+    def strings(self, name):
+        return Strings(self.section(name), self.array(name + ".off"))
+
+
+def write_artifact(path, version, sections):
+    """Write ``sections`` (name -> bytes) to ``path`` atomically."""
+    table_end = _HEADER.size + len(sections) * _SECTION.size
+    offset = (table_end + 7) & ~7
+    table = []
+    for name, data in sections.items():
+        table.append((name.encode(), offset, len(data)))
+        offset = (offset + len(data) + 7) & ~7
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), version))
+        for entry in table:
+            f.write(_SECTION.pack(*entry))
+        for (_, start, _), data in zip(table, sections.values()):
+            f.write(b"\x00" * (start - f.tell()))
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class Lexicon:
+    """Frozen word list with case-folded, constant-time membership checks."""
+
+    __slots__ = ("words", "_folded", "version", "artifact")
+
+    def __init__(self, entries):
+        # Keep the original spellings (in corpus order) for correction candidates
+        self.words = tuple(dict.fromkeys(entries))
+        self._folded = frozenset(w.casefold() for w in self.words)
+        self.version = hashlib.sha1("\n".join(self.words).encode()).hexdigest()
+        self.artifact = None
+
+    def __contains__(self, word):
+        return word.casefold() in self._folded
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def sections(self):
+        """The artifact sections ``MappedLexicon`` reads."""
+        words, offsets = _pack_strings(self.words)
+        keys = sorted(w.encode() for w in self._folded)
+        folded, folded_offsets = _pack_strings(keys)
+
+        # Open addressing over the folded words: slot -> word number + 1
+        size = 1 << (2 * len(keys)).bit_length()
+        table = [0] * size
+        for i, key in enumerate(keys, 1):
+            slot = zlib.crc32(key) & (size - 1)
+            while table[slot]:
+                slot = (slot + 1) & (size - 1)
+            table[slot] = i
+
+        return {
+            "words": words,
+            "words.off": offsets,
+            "folded": folded,
+            "folded.off": folded_offsets,
+            "folded.hash": struct.pack(f"<{size}I", *table),
+        }
+
+
+class MappedLexicon(Lexicon):
+    """``Lexicon`` backed by an artifact instead of the heap.
+
+    Membership probes the artifact's CRC32 hash table of case-folded words,
+    so a lookup touches a slot or two and compares bytes in place.
+    """
+
+    __slots__ = ("_blob", "_offsets", "_table")
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.version = artifact.version
+        self.words = artifact.strings("words")
+        self._blob = artifact.section("folded")
+        self._offsets = artifact.array("folded.off")
+        self._table = artifact.array("folded.hash")
+        if (
+            not self._offsets
+            or not self._table
+            or len(self._table) & (len(self._table) - 1)
+        ):
+            raise ArtifactError(f"{artifact.path} has a malformed folded index")
+
+    def __contains__(self, word):
+        key = word.casefold().encode()
+        table, offsets = self._table, self._offsets
+        mask = len(table) - 1
+        slot = zlib.crc32(key) & mask
+        while i := table[slot]:
+            if self._blob[offsets[i - 1] : offsets[i]] == key:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+
+def build_lexicon():
+    """Read the nltk words corpus, downloading it if needed."""
+    from nltk import download
+    from nltk.corpus import words
+
+    download("words")
+    return Lexicon(words.words())
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(path=None):
+    """Map the prebuilt lexicon artifact once per process.
+
+    ``path`` defaults to the ``lexicon_path`` setting, then ``lexicon.bin``
+    beside this module (see build_lexicon.py). Without a usable artifact the
+    lexicon is read from an already installed nltk words corpus; nothing is
+    downloaded at runtime, and ArtifactError is raised if neither is there.
+    """
+    path = path or os.getenv("lexicon_path") or DEFAULT_PATH
+    try:
+        return MappedLexicon(Artifact(path))
+    except (OSError, ArtifactError) as e:
+        logger.warning("No lexicon artifact (%s), reading the nltk corpus", e)
+
+    from nltk.corpus import words
+
+    try:
+        return Lexicon(words.words())
+    except LookupError:
+        raise ArtifactError(
+            f"no lexicon artifact at {path} and no nltk words corpus installed; "
+            "run python build_lexicon.py to build the artifact"
+        ) from None
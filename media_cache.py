@@ -0,0 +1,97 @@
+import logging
+import threading
+
+from pymongo.errors import PyMongoError
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """Telegram ``file_id``s of media the bot sends by URL, kept in Mongo.
+
+    The first send of a URL makes Telegram fetch it; the ``file_id`` in the
+    sent message is remembered and sent instead from then on, which needs no
+    fetch at all. Entries are read from ``collection`` on first use, so they
+    survive restarts.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._file_ids = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stored": 0, "expired": 0}
+
+    def ensure_index(self):
+        self._collection.create_index("url", unique=True)
+
+    def get(self, url):
+        """What to send for ``url``: its cached ``file_id``, else the URL."""
+        with self._lock:
+            if self._file_ids is None:
+                self._load()
+            file_id = self._file_ids.get(url)
+            self._counters["hits" if file_id else "misses"] += 1
+        return file_id or url
+
+    def send(self, send, url, kind):
+        """Send ``url`` as ``kind`` media and learn its file_id; returns a Future.
+
+        ``send(**{kind: media})`` queues the matching Bot API call, e.g. a
+        ``send_animation`` partial of Outbox.reply for ``kind="animation"``,
+        and returns its Future. A cached file_id that Telegram rejects is
+        dropped and the URL is sent in its place straight away.
+        """
+        media = self.get(url)
+        future = send(**{kind: media})
+        future.add_done_callback(lambda f: self._done(send, url, kind, media, f))
+        return future
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._file_ids or ()))
+
+    def _load(self):
+        try:
+            docs = self._collection.find({}, {"_id": 0, "url": 1, "file_id": 1})
+            self._file_ids = {doc["url"]: doc["file_id"] for doc in docs}
+        except PyMongoError:
+            logger.exception("Failed to load cached file ids")
+            self._file_ids = {}
+
+    def _done(self, send, url, kind, sent, future):
+        if future.cancelled():
+            return
+        if (error := future.exception()) is not None:
+            if sent != url and isinstance(error, BadRequest):
+                logger.warning("Cached file id for %s was rejected: %s", url, error)
+                with self._lock:
+                    if self._file_ids.get(url) == sent:
+                        del self._file_ids[url]
+                        self._counters["expired"] += 1
+                try:
+                    self._collection.delete_one({"url": url, "file_id": sent})
+                except PyMongoError:
+                    logger.exception("Failed to drop the file id for %s", url)
+                resent = send(**{kind: url})
+                resent.add_done_callback(lambda f: self._done(send, url, kind, url, f))
+            return
+        if sent != url:
+            return
+
+        # The attachment of the kind sent: a GIF also comes back as a document
+        attachment = getattr(future.result(), kind, None)
+        if isinstance(attachment, list):  # photos come in several sizes
+            attachment = attachment[-1]
+        file_id = getattr(attachment, "file_id", None)
+        if file_id is None:
+            return
+        with self._lock:
+            self._file_ids[url] = file_id
+            self._counters["stored"] += 1
+        try:
+            self._collection.update_one(
+                {"url": url}, {"$set": {"file_id": file_id}}, upsert=True
+            )
+        except PyMongoError:
+            logger.exception("Failed to store the file id for %s", url)
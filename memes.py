@@ -0,0 +1,120 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class MemeError(Exception):
+    pass
+
+
+class MemeClient:
+    """imgflip client with a pooled session and a TTL-cached template catalog.
+
+    The catalog is fetched once and then refreshed in a background thread
+    when it is older than ``ttl`` seconds; until the refresh lands the old
+    catalog keeps being served, so only ``caption_image`` is on the hot path.
+    """
+
+    def __init__(
+        self,
+        username,
+        password,
+        base_url="https://api.imgflip.com",
+        ttl=3600,
+        timeout=(3.05, 10),
+        retries=3,
+    ):
+        self.username = username
+        self.password = password
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+        )
+        adapter = HTTPAdapter(pool_maxsize=16, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._templates = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def templates(self):
+        """The meme template catalog, fetching it on first use."""
+        if self._templates is None:
+            self.refresh()
+        elif time.monotonic() - self._fetched_at > self.ttl:
+            self.refresh_in_background()
+        return self._templates
+
+    def refresh(self):
+        response = self.session.get(f"{self.base_url}/get_memes", timeout=self.timeout)
+        response.raise_for_status()
+        templates = _field(response.json(), "data", "memes")
+        if not isinstance(templates, list) or not templates:
+            raise MemeError("imgflip returned no meme templates")
+        with self._lock:
+            self._templates = templates
+            self._fetched_at = time.monotonic()
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def caption(self, top_text, bottom_text, template_id=None):
+        """Caption a template (a random one by default) and return the image URL."""
+        if template_id is None:
+            template_id = _field(random.choice(self.templates()), "id")
+
+        params = {
+            "username": self.username,
+            "password": self.password,
+            "template_id": template_id,
+            "text0": top_text,
+            "text1": bottom_text,
+        }
+        response = self.session.post(
+            f"{self.base_url}/caption_image", params=params, timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict) or not data.get("success"):
+            error = data.get("error_message") if isinstance(data, dict) else None
+            raise MemeError(error or "caption_image failed")
+        return _field(data, "data", "url")
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Failed to refresh the meme template catalog")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+def _field(data, *path):
+    """``data[path[0]][path[1]]...``, or MemeError if the response has no such field."""
+    try:
+        for key in path:
+            data = data[key]
+    except (KeyError, IndexError, TypeError):
+        raise MemeError(f"unexpected imgflip response, no {'.'.join(path)}") from None
+    return data
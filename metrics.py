@@ -0,0 +1,336 @@
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import monitoring
+from telegram.ext import ConversationHandler
+from telegram.utils.request import Request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _labels(names, values, extra=""):
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            lines.extend(self._samples(label_values, value))
+        return lines
+
+    def _samples(self, label_values, value):
+        return [f"{self.name}{_labels(self.labels, label_values)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    """A gauge that is either set directly or read from ``fn`` when scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def exposition(self):
+        if self.fn is not None:
+            self.set(self.fn())
+        return super().exposition()
+
+
+class CallbackCounter(Gauge):
+    """A counter kept elsewhere and read from ``fn`` when scraped."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # A count per bucket and for +Inf, then the running sum
+                counts = [0] * (len(self.buckets) + 1) + [0.0]
+                self._values[label_values] = counts
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def _samples(self, label_values, counts):
+        lines = []
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            labels = _labels(self.labels, label_values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _labels(self.labels, label_values)
+        lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+        lines.append(f"{self.name}_count{labels} {counts[-2]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def exposition(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.exposition())
+            except Exception:
+                logger.exception("Failed to collect %s", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(
+    Histogram("annoyingu_handler_seconds", "Time spent in each handler.", ["handler"])
+)
+HANDLER_ERRORS = REGISTRY.register(
+    Counter("annoyingu_handler_errors_total", "Handler calls that raised.", ["handler"])
+)
+HANDLERS_IN_PROGRESS = REGISTRY.register(
+    Gauge("annoyingu_handlers_in_progress", "Handler calls currently running.")
+)
+MONGO_SECONDS = REGISTRY.register(
+    Histogram(
+        "annoyingu_mongo_command_seconds",
+        "Mongo command round-trips.",
+        ["command", "collection"],
+    )
+)
+MONGO_ERRORS = REGISTRY.register(
+    Counter("annoyingu_mongo_errors_total", "Failed Mongo commands.", ["command"])
+)
+TELEGRAM_SECONDS = REGISTRY.register(
+    Histogram(
+        "annoyingu_telegram_api_seconds",
+        "Telegram Bot API calls, including getUpdates long polls.",
+        ["method"],
+    )
+)
+TELEGRAM_ERRORS = REGISTRY.register(
+    Counter(
+        "annoyingu_telegram_api_errors_total",
+        "Failed Telegram Bot API calls; RetryAfter means rate limited.",
+        ["method", "error"],
+    )
+)
+REGISTRY.register(
+    CallbackCounter(
+        "process_cpu_seconds_total",
+        "CPU time used by the bot process.",
+        fn=time.process_time,
+    )
+)
+
+
+def instrument(callback, name=None):
+    """Wrap a handler callback to record its latency and errors."""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        HANDLERS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            return callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+            HANDLERS_IN_PROGRESS.dec()
+
+    return wrapper
+
+
+def _handlers(handlers):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from _handlers(handler.entry_points)
+            for state in handler.states.values():
+                yield from _handlers(state)
+            yield from _handlers(handler.fallbacks)
+        else:
+            yield handler
+
+
+def instrument_dispatcher(dispatcher):
+    """Instrument every registered handler, conversation steps included.
+
+    Also exports the update queue depth and worker count; the utilisation of
+    the dispatcher is the rate of ``annoyingu_handler_seconds_sum``.
+    """
+    seen = set()
+    for group in dispatcher.handlers.values():
+        for handler in _handlers(group):
+            if id(handler) not in seen:
+                seen.add(id(handler))
+                handler.callback = instrument(handler.callback)
+
+    REGISTRY.register(
+        Gauge(
+            "annoyingu_update_queue_depth",
+            "Updates waiting for the dispatcher.",
+            fn=dispatcher.update_queue.qsize,
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "annoyingu_dispatcher_workers",
+            "Worker threads for run_async handlers.",
+            fn=lambda: dispatcher.workers,
+        )
+    )
+
+
+class InstrumentedRequest(Request):
+    """Times every Bot API request; pass it to Bot(request=...)."""
+
+    def _request_wrapper(self, method, url, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            return super()._request_wrapper(method, url, *args, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, api_method)
+
+
+def register_stats(prefix, stats, help="Component statistics."):
+    """Export every numeric value of a ``stats()`` dict as a gauge."""
+    for key, value in stats().items():
+        if isinstance(value, (int, float)):
+            REGISTRY.register(
+                Gauge(f"{prefix}_{key}", help, fn=lambda key=key: stats()[key])
+            )
+
+
+class MongoListener(monitoring.CommandListener):
+    """Times every Mongo command; pass it to MongoClient(event_listeners=...)."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = (
+            value if isinstance(value, str) else event.command.get("collection", "")
+        )
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_SECONDS.observe(
+            event.duration_micros / 1e6, event.command_name, collection
+        )
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_SECONDS.observe(
+            event.duration_micros / 1e6, event.command_name, collection
+        )
+        MONGO_ERRORS.inc(event.command_name)
+
+
+def serve(port, listen="127.0.0.1", registry=REGISTRY):
+    """Serve ``registry`` in the Prometheus text format on ``/metrics``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((listen, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving metrics on %s:%d/metrics", listen, port)
+    return server
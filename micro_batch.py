@@ -0,0 +1,94 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Groups items from concurrent callers into batches for ``fn``.
+
+    The first item of a batch opens a window of ``max_delay`` seconds; every
+    item submitted before it closes, up to ``max_batch``, goes into the same
+    ``fn(items)`` call, which must return one result per item. The window
+    also closes once nothing has arrived for ``max_idle`` seconds, so a lull
+    does not hold back callers that are already waiting. Callers block in
+    ``map`` until their own slice of the results is ready.
+    """
+
+    def __init__(self, fn, max_batch=256, max_delay=0.005, max_idle=0.0005):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_idle = max_idle
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "items": 0, "batches": 0, "max_batch": 0}
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batch", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, items):
+        """Queue ``items`` for the next batch; the Future yields their results."""
+        future = Future()
+        if items:
+            self._queue.put((list(items), future))
+        else:
+            future.set_result([])
+        return future
+
+    def map(self, items, timeout=None):
+        """Results for ``items``, or None for each if the batch fails or times out."""
+        try:
+            return self.submit(items).result(timeout)
+        except TimeoutError:
+            logger.warning("Batch of %d items timed out", len(items))
+        except Exception:
+            pass  # already logged by the batch thread
+        return [None] * len(items)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_delay
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=min(remaining, self.max_idle))
+                except queue.Empty:
+                    break
+                pending.append(request)
+                size += len(request[0])
+            self._process(pending, size)
+
+    def _process(self, pending, size):
+        items = [item for request, _ in pending for item in request]
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            logger.exception("Batch of %d items failed", size)
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for request, future in pending:
+            future.set_result(results[start : start + len(request)])
+            start += len(request)
+
+        with self._lock:
+            counters = self._counters
+            counters["requests"] += len(pending)
+            counters["items"] += size
+            counters["batches"] += 1
+            counters["max_batch"] = max(counters["max_batch"], size)
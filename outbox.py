@@ -0,0 +1,309 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from telegram import Chat
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class Dropped(Exception):
+    """Set on a send's Future when the outbox gave up on it unsent."""
+
+
+class TokenBucket:
+    """Allows ``rate`` sends a second on average and bursts of up to ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait(self, now):
+        """Seconds until a token is available, 0 if one is."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        """Hold back the next token for ``seconds``, e.g. after a 429."""
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def full(self, now):
+        return self.wait(now) == 0.0 and self.tokens >= self.burst
+
+
+class _Send:
+    __slots__ = ("method", "chat_id", "kwargs", "key", "future", "queued")
+
+    def __init__(self, method, chat_id, kwargs, key):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+        self.queued = time.monotonic()
+
+
+class Outbox:
+    """Sends Bot API messages from background threads within flood limits.
+
+    Handlers queue a send and return at once. Every chat has a token bucket,
+    groups a slower one, and all chats share a global bucket, so a burst in
+    one chat neither trips Telegram's flood limits nor delays other chats.
+    A chat's sends go out one at a time in the order they were queued. A
+    text reply queued while an earlier reply to the same message is still
+    waiting is appended to it, so one incoming message costs one send. A 429
+    pauses the chat for the ``retry_after`` Telegram asks for, then retries.
+
+    A busy group can queue faster than its bucket drains, so each chat's
+    backlog is bounded. Once ``max_pending`` sends wait, a new text is
+    appended to the chat's last pending text whatever message it replies
+    to, and otherwise the oldest send is dropped. Sends still waiting after
+    ``max_age`` seconds are dropped too, since a late notice is worse than
+    none. Dropped sends fail their Future with ``Dropped``.
+    """
+
+    def __init__(
+        self,
+        bot,
+        rate=30.0,
+        chat_rate=1.0,
+        group_rate=20 / 60,
+        chat_burst=3,
+        senders=4,
+        max_pending=20,
+        max_age=60.0,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._global = TokenBucket(rate, max(1.0, rate))
+        self._buckets = {}  # chat id -> TokenBucket
+        self._queues = OrderedDict()  # chat id -> deque of _Send, in turn order
+        self._busy = set()  # chats with a send in flight
+        self._cond = threading.Condition()
+        self._closed = False
+        self._next_sweep = 0.0
+        self._counters = {
+            "queued": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "dropped": 0,
+            "expired": 0,
+            "last_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "total_wait_seconds": 0.0,
+        }
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            for i in range(senders)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, method, chat_id, coalesce=None, **kwargs):
+        """Queue ``bot.<method>(chat_id=chat_id, **kwargs)``; returns a Future.
+
+        ``send_message`` texts with the same ``coalesce`` key and otherwise
+        identical arguments are joined while they wait.
+        """
+        with self._cond:
+            queue = self._queues.get(chat_id)
+            if queue and method == "send_message":
+                last = queue[-1]
+                if coalesce is not None and last.key == coalesce:
+                    joined = self._join(last, kwargs)
+                elif len(queue) >= self.max_pending:
+                    joined = self._join_any(queue, kwargs)
+                else:
+                    joined = None
+                if joined is not None:
+                    return joined
+
+            send = _Send(method, chat_id, kwargs, coalesce)
+            if queue is None:
+                queue = self._queues[chat_id] = deque()
+            elif len(queue) >= self.max_pending:
+                self._drop(queue.popleft(), "dropped", "backlog full")
+            queue.append(send)
+            self._counters["queued"] += 1
+            self._cond.notify()
+        return send.future
+
+    def reply(self, message, method="send_message", **kwargs):
+        """Queue a send to ``message``'s chat, quoted in groups like reply_text."""
+        if message.chat.type != Chat.PRIVATE:
+            kwargs.setdefault("reply_to_message_id", message.message_id)
+        return self.send(method, message.chat_id, coalesce=message.message_id, **kwargs)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._counters,
+                queue_depth=sum(len(queue) for queue in self._queues.values()),
+                in_flight=len(self._busy),
+            )
+
+    def close(self, timeout=10):
+        """Send what is still queued, within the limits, then stop."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            unsent = [send for queue in self._queues.values() for send in queue]
+            self._queues.clear()
+            for send in unsent:
+                self._drop(send, "dropped", "outbox closed")
+        if unsent:
+            logger.warning("Dropped %d unsent messages", len(unsent))
+
+    def _join(self, pending, kwargs, ignore=("text",)):
+        if pending.method != "send_message" or not _joinable(
+            pending.kwargs, kwargs, ignore
+        ):
+            return None
+        pending.kwargs["text"] += "\n\n" + kwargs["text"]
+        self._counters["coalesced"] += 1
+        return pending.future
+
+    def _join_any(self, queue, kwargs):
+        # The backlog is full: fold the text into the chat's latest pending
+        # one, even if that replies to another message
+        for pending in reversed(queue):
+            if pending.method == "send_message":
+                return self._join(pending, kwargs, ("text", "reply_to_message_id"))
+        return None
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _drop(self, send, counter, reason):
+        self._counters[counter] += 1
+        if not send.future.done():
+            send.future.set_exception(
+                Dropped(f"{send.method} to {send.chat_id}: {reason}")
+            )
+
+    def _expire(self, now):
+        # Every chat's oldest sends are at its head
+        for chat_id, queue in list(self._queues.items()):
+            while queue and now - queue[0].queued > self.max_age:
+                self._drop(queue.popleft(), "expired", "waited too long")
+            if not queue:
+                del self._queues[chat_id]
+
+    def _next(self, now):
+        """The next send allowed now, else None and how long to wait."""
+        self._expire(now)
+        if not self._queues:
+            return None, None
+        wait = self._global.wait(now)
+        if wait:
+            return None, wait
+
+        wait = None
+        for chat_id, queue in self._queues.items():
+            if chat_id in self._busy:
+                continue
+            bucket = self._bucket(chat_id)
+            chat_wait = bucket.wait(now)
+            if chat_wait:
+                wait = chat_wait if wait is None else min(wait, chat_wait)
+                continue
+
+            bucket.take()
+            self._global.take()
+            send = queue.popleft()
+            # Take turns: the chat goes to the back of the line
+            del self._queues[chat_id]
+            if queue:
+                self._queues[chat_id] = queue
+            return send, None
+        return None, wait
+
+    def _sweep(self, now):
+        # Buckets that have refilled hold no state worth keeping
+        for chat_id, bucket in list(self._buckets.items()):
+            if chat_id not in self._queues and bucket.full(now):
+                del self._buckets[chat_id]
+        self._next_sweep = now + 60
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if now >= self._next_sweep:
+                        self._sweep(now)
+                    send, wait = self._next(now)
+                    if send is not None:
+                        break
+                    if self._closed and not self._queues:
+                        return
+                    self._cond.wait(wait)
+                self._busy.add(send.chat_id)
+            try:
+                self._deliver(send)
+            finally:
+                with self._cond:
+                    self._busy.discard(send.chat_id)
+                    self._cond.notify_all()
+
+    def _deliver(self, send):
+        waited = time.monotonic() - send.queued
+        try:
+            result = getattr(self.bot, send.method)(chat_id=send.chat_id, **send.kwargs)
+        except RetryAfter as e:
+            logger.warning(
+                "Rate limited in chat %s for %ss", send.chat_id, e.retry_after
+            )
+            with self._cond:
+                self._bucket(send.chat_id).pause(e.retry_after)
+                self._queues.setdefault(send.chat_id, deque()).appendleft(send)
+                self._counters["rate_limited"] += 1
+            return
+        except Exception as e:
+            logger.exception("Failed to %s in chat %s", send.method, send.chat_id)
+            with self._cond:
+                self._counters["errors"] += 1
+            send.future.set_exception(e)
+            return
+
+        send.future.set_result(result)
+        with self._cond:
+            counters = self._counters
+            counters["sent"] += 1
+            counters["last_wait_seconds"] = waited
+            counters["total_wait_seconds"] += waited
+            counters["max_wait_seconds"] = max(counters["max_wait_seconds"], waited)
+
+
+def _joinable(pending, kwargs, ignore=("text",)):
+    if set(pending) != set(kwargs):
+        return False
+    if any(pending[name] != kwargs[name] for name in pending if name not in ignore):
+        return False
+    return len(pending["text"]) + 2 + len(kwargs["text"]) <= MAX_MESSAGE_LENGTH
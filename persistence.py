@@ -0,0 +1,174 @@
+import datetime
+import hashlib
+import logging
+import pickle
+import threading
+from collections import defaultdict
+
+from bson.binary import Binary
+from pymongo import DESCENDING
+from telegram.ext import BasePersistence
+
+logger = logging.getLogger(__name__)
+
+
+class MongoPersistence(BasePersistence):
+    """Keeps ``chat_data`` (typo history and friends) in Mongo across restarts.
+
+    A chat is read from ``collection`` the first time the dispatcher sees
+    it, so restarts do not load every chat up front. After each update the
+    dispatcher hands over that chat's data, which only marks the chat dirty;
+    no copy is made on the dispatcher thread. Every ``interval`` seconds the
+    dirty chats are pickled and those whose data actually changed are queued
+    on the write-behind ``writer``. A chat changed while it is pickled is
+    marked dirty again by that update, so the next pass writes it in full.
+    Keys in ``excluded`` (``chat_settings`` lives in its own collection) are
+    skipped.
+    """
+
+    def __init__(self, collection, writer, interval=30.0, excluded=("chat_settings",)):
+        super().__init__(
+            store_user_data=False, store_chat_data=True, store_bot_data=False
+        )
+        self.collection = collection
+        self.writer = writer
+        self.interval = interval
+        self.excluded = frozenset(excluded)
+        self._dirty = {}
+        self._loaded = set()
+        self._digests = {}
+        self._lock = threading.Lock()  # guards _dirty, taken by the dispatcher
+        self._write_lock = threading.Lock()  # one pass of _write_dirty at a time
+        self._stop = threading.Event()
+        self._counters = {"loaded": 0, "marked": 0, "written": 0, "unchanged": 0}
+        self._thread = threading.Thread(
+            target=self._run, name="chat-data-persistence", daemon=True
+        )
+        self._thread.start()
+
+    # chat_data holds no Bot objects, so PTB's deep copies that swap them
+    # out and back in are skipped
+
+    @classmethod
+    def replace_bot(cls, obj):
+        return obj
+
+    def insert_bot(self, obj):
+        return obj
+
+    def ensure_index(self):
+        self.collection.create_index("chatid", unique=True)
+        self.collection.create_index("updated")
+
+    def get_chat_data(self):
+        return defaultdict(dict)
+
+    def refresh_chat_data(self, chat_id, chat_data):
+        if chat_id in self._loaded:
+            return
+        self._loaded.add(chat_id)
+        doc = self.collection.find_one({"chatid": chat_id}, {"data": 1})
+        if doc is None:
+            return
+        payload = bytes(doc["data"])
+        self._digests[chat_id] = hashlib.sha1(payload).digest()
+        for key, value in pickle.loads(payload).items():
+            chat_data.setdefault(key, value)
+        self._counters["loaded"] += 1
+
+    def update_chat_data(self, chat_id, data):
+        with self._lock:
+            self._dirty[chat_id] = data
+            self._counters["marked"] += 1
+
+    def flush(self):
+        """Queue every dirty chat and push the queue to Mongo."""
+        self._stop.set()
+        self._write_dirty()
+        self.writer.flush()
+
+    def recent_chats(self, limit, since=None):
+        """Ids of the ``limit`` chats whose data changed most recently."""
+        query = {"updated": {"$gte": since}} if since else {}
+        cursor = (
+            self.collection.find(query, {"chatid": 1})
+            .sort("updated", DESCENDING)
+            .limit(limit)
+        )
+        return [doc["chatid"] for doc in cursor]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, dirty=len(self._dirty))
+
+    def _write_dirty(self):
+        with self._write_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+
+            now = datetime.datetime.utcnow()
+            written = unchanged = 0
+            for chat_id, data in dirty.items():
+                payload = self._snapshot(data)
+                if payload is None:
+                    with self._lock:
+                        self._dirty.setdefault(chat_id, data)
+                    continue
+                digest = hashlib.sha1(payload).digest()
+                if self._digests.get(chat_id) == digest:
+                    unchanged += 1
+                    continue
+                self._digests[chat_id] = digest
+                self.writer.set(
+                    self.collection, chat_id, {"data": Binary(payload), "updated": now}
+                )
+                written += 1
+
+            with self._lock:
+                self._counters["written"] += written
+                self._counters["unchanged"] += unchanged
+
+    def _snapshot(self, data, attempts=3):
+        # The dispatcher may change the chat while it is pickled; a dict that
+        # grows mid-pickle raises, so take the snapshot again
+        for _ in range(attempts):
+            try:
+                return pickle.dumps(
+                    {
+                        key: value
+                        for key, value in data.items()
+                        if key not in self.excluded
+                    },
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            except RuntimeError:
+                continue
+        logger.warning("Chat data kept changing while it was pickled, retrying later")
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._write_dirty()
+            except Exception:
+                logger.exception("Failed to persist chat data")
+
+    # Only chat_data is persisted
+
+    def get_user_data(self):
+        return defaultdict(dict)
+
+    def get_bot_data(self):
+        return {}
+
+    def get_conversations(self, name):
+        return {}
+
+    def update_user_data(self, user_id, data):
+        pass
+
+    def update_bot_data(self, data):
+        pass
+
+    def update_conversation(self, name, key, new_state):
+        pass
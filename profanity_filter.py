@@ -0,0 +1,112 @@
+from functools import lru_cache
+
+from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+_END = ""
+
+# Text character -> pattern characters it may stand for, e.g. "@" -> {"a", "o"}
+_SUBSTITUTES = {}
+for _char, _variants in profanity.CHARS_MAPPING.items():
+    for _variant in _variants:
+        _SUBSTITUTES.setdefault(_variant, {_variant}).add(_char)
+
+
+class ProfanityMatcher:
+    """Compiled censor-word trie, matched at word boundaries.
+
+    Follows better_profanity's rules (character substitutions such as ``@``
+    for ``a``, whole-word matches, and words spelt across separators like
+    ``a s s``) without expanding every variant: a text character walks every
+    trie edge it may stand for. Because censor words only match whole words,
+    the walk is anchored at word starts and needs no Aho-Corasick failure
+    links. A chat's custom words are compiled on top of a shared ``base``.
+    """
+
+    def __init__(self, words, base=None):
+        self._root = {}
+        # Like better_profanity, join at most as many words as a censor word
+        # has separators
+        self._max_joins = base._max_joins if base else 1
+        for word in words:
+            node = self._root
+            for char in word.lower():
+                node = node.setdefault(char, {})
+            node[_END] = True
+            separators = sum(char not in ALLOWED_CHARACTERS for char in word)
+            self._max_joins = max(self._max_joins, separators)
+        self._roots = [self._root] + (base._roots if base else [])
+
+    def contains_profanity(self, text):
+        text = text.lower()
+        for start, char in enumerate(text):
+            if char in ALLOWED_CHARACTERS and (
+                start == 0 or text[start - 1] not in ALLOWED_CHARACTERS
+            ):
+                if self._matches_at(text, start):
+                    return True
+        return False
+
+    def _matches_at(self, text, start):
+        length = len(text)
+        stack = [(start, root, 0) for root in self._roots]
+        while stack:
+            i, node, joins = stack.pop()
+            if i == length:
+                continue
+            char = text[i]
+            for option in _SUBSTITUTES.get(char, (char,)):
+                child = node.get(option)
+                if child is None:
+                    continue
+                if _END in child and (
+                    i + 1 == length or text[i + 1] not in ALLOWED_CHARACTERS
+                ):
+                    return True
+                stack.append((i + 1, child, joins))
+
+            # Continue the same censor word in the next word, dropping the
+            # separators in between
+            if (
+                char not in ALLOWED_CHARACTERS
+                and text[i - 1] in ALLOWED_CHARACTERS
+                and joins < self._max_joins
+            ):
+                j = i
+                while j < length and text[j] not in ALLOWED_CHARACTERS:
+                    j += 1
+                stack.append((j, node, joins + 1))
+        return False
+
+
+@lru_cache(maxsize=None)
+def default_matcher():
+    """Matcher for better_profanity's default word list, built once."""
+    return ProfanityMatcher(
+        read_wordlist(get_complete_path_of_file("profanity_wordlist.txt"))
+    )
+
+
+# chat id -> (settings version, matcher)
+_matchers = {}
+
+
+def matcher_for(chat_settings):
+    """Return the chat's cached matcher, rebuilding it when its settings change.
+
+    ``change_settings`` and ``change_wordlist`` bump ``chat_settings["version"]``
+    whenever they write the settings to Mongo, which retires the cached entry.
+    """
+    chat_id = chat_settings["chatid"]
+    version = chat_settings.get("version", 0)
+    cached = _matchers.get(chat_id)
+    if cached is None or cached[0] != version:
+        blacklist = chat_settings["wordlist"]
+        matcher = (
+            ProfanityMatcher(blacklist, base=default_matcher())
+            if blacklist
+            else default_matcher()
+        )
+        cached = _matchers[chat_id] = (version, matcher)
+    return cached[1]
@@ -0,0 +1,57 @@
+from collections import namedtuple
+
+LastCalled = namedtuple(
+    "LastCalled", ["first_name", "last_name", "user_id", "datetime"]
+)
+
+_LEGACY_SEPARATOR = " (*&%^) "
+
+
+def _from_document(doc):
+    if "userstring" in doc and "userid" not in doc:
+        first_name, last_name, user_id = doc["userstring"].split(_LEGACY_SEPARATOR)
+        return LastCalled(first_name, last_name, int(user_id), doc["datetime"])
+    return LastCalled(doc["firstname"], doc["lastname"], doc["userid"], doc["datetime"])
+
+
+class ProfanityTimes:
+    """Last vulgarity per chat, served from memory and written behind to Mongo.
+
+    Chats are read from ``collection`` the first time they are seen, or all
+    at once by ``seed``, after which lookups never touch Mongo.
+    """
+
+    def __init__(self, collection, writer, cache=None):
+        self._collection = collection
+        self._writer = writer
+        self._cache = {} if cache is None else cache
+        self._seeded = False
+
+    def seed(self):
+        """Load every chat up front so the hot path does no reads at all."""
+        for doc in self._collection.find():
+            self._cache[doc["chatid"]] = _from_document(doc)
+        self._seeded = True
+
+    def get(self, chat_id):
+        if chat_id in self._cache or self._seeded:
+            return self._cache.get(chat_id)
+        doc = self._collection.find_one({"chatid": chat_id})
+        last_called = self._cache[chat_id] = _from_document(doc) if doc else None
+        return last_called
+
+    def record(self, chat_id, first_name, last_name, user_id, when):
+        """Store a new vulgarity and return the one it replaces, if any."""
+        previous = self.get(chat_id)
+        self._cache[chat_id] = LastCalled(first_name, last_name, user_id, when)
+        self._writer.set(
+            self._collection,
+            chat_id,
+            {
+                "firstname": first_name,
+                "lastname": last_name,
+                "userid": user_id,
+                "datetime": when,
+            },
+        )
+        return previous
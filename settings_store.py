@@ -0,0 +1,91 @@
+import logging
+import threading
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "Spelling Hornets": True,
+    "Profanity Alert": True,
+    "wordlist": [],
+    "whitelist": [],
+}
+
+# Every field the handlers read from a chat's settings
+PROJECTION = {
+    "_id": 0,
+    "chatid": 1,
+    "version": 1,
+    "spelling_backend": 1,
+    **{field: 1 for field in DEFAULTS},
+}
+
+
+class SettingsStore:
+    """Chat settings documents, read one chat at a time by ``chatid``.
+
+    ``load`` returns a chat's settings and inserts the defaults in the same
+    atomic upsert when the chat has none, so a chat whose chat_data was lost
+    picks its settings back up instead of gaining a duplicate document.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_index(self):
+        """Create the unique ``chatid`` index, dropping older duplicates first."""
+        try:
+            self.collection.create_index("chatid", unique=True)
+        except (DuplicateKeyError, OperationFailure):
+            self._drop_duplicates()
+            self.collection.create_index("chatid", unique=True)
+
+    def load(self, chat_id):
+        return self.collection.find_one_and_update(
+            {"chatid": chat_id},
+            {"$setOnInsert": DEFAULTS},
+            projection=PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def prefetch(self, chat_data, chat_ids):
+        """Fill ``chat_data[chat_id]["chat_settings"]`` for chats not loaded yet."""
+        loaded = 0
+        for doc in self.collection.find(
+            {"chatid": {"$in": list(chat_ids)}}, PROJECTION
+        ):
+            chat_data[doc["chatid"]].setdefault("chat_settings", doc)
+            loaded += 1
+        return loaded
+
+    def prefetch_in_background(self, chat_data, chat_ids):
+        """Run ``prefetch`` off the startup path; ``chat_ids`` may be a callable."""
+
+        def run():
+            try:
+                ids = chat_ids() if callable(chat_ids) else chat_ids
+                logger.info(
+                    "Prefetched settings for %d chats", self.prefetch(chat_data, ids)
+                )
+            except PyMongoError:
+                logger.exception("Failed to prefetch chat settings")
+
+        threading.Thread(target=run, name="settings-prefetch", daemon=True).start()
+
+    def _drop_duplicates(self):
+        # The newest document is the one the old startup scan ended up using
+        duplicates = self.collection.aggregate(
+            [
+                {"$group": {"_id": "$chatid", "ids": {"$push": "$_id"}}},
+                {"$match": {"ids.1": {"$exists": True}}},
+            ]
+        )
+        for group in duplicates:
+            stale = sorted(group["ids"])[:-1]
+            logger.warning(
+                "Dropping %d duplicate settings for chat %s", len(stale), group["_id"]
+            )
+            self.collection.delete_many({"_id": {"$in": stale}})
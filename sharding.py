@@ -0,0 +1,140 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import zlib
+from queue import Full
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(update):
+    """The id an update is routed by: its chat, else its user."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return 0
+
+
+def shard_for(key, shards):
+    """Stable shard number for ``key``; the same in every process and run."""
+    return zlib.crc32(key.to_bytes(8, "little", signed=True)) % shards
+
+
+class Shards:
+    """Worker processes that each handle a fixed share of the chats.
+
+    Every worker is spawned as ``target(shard, updates)`` and reads the
+    updates routed to it from its ``updates`` queue, ending on None. A chat
+    always maps to the same worker and each queue is FIFO, so a chat's
+    updates reach its dispatcher in the order Telegram sent them, while
+    different chats are handled in parallel without sharing a GIL, a
+    chat_data dict or any cache.
+
+    A worker found dead while routing is started again on the same queue,
+    so the updates waiting for it are handled by its replacement.
+    """
+
+    def __init__(self, count, target, queue_size=1000, put_timeout=1.0):
+        self._context = multiprocessing.get_context("spawn")
+        self._target = target
+        self.count = count
+        self.put_timeout = put_timeout
+        self.queues = [self._context.Queue(queue_size) for _ in range(count)]
+        self.processes = [self._start(shard) for shard in range(count)]
+        self._routed = [0] * count
+        self._restarts = 0
+        self._lock = threading.Lock()
+
+    def route(self, update, context=None):
+        """Hand ``update`` to its worker; usable as a TypeHandler callback.
+
+        Blocks while the worker's queue is full, which in turn holds back
+        the ingress instead of buffering without bound. The worker is
+        checked every ``put_timeout`` seconds and restarted if it died.
+        """
+        shard = shard_for(shard_key(update), self.count)
+        data = update.to_dict()
+        while True:
+            self._revive(shard)
+            try:
+                self.queues[shard].put(data, timeout=self.put_timeout)
+                break
+            except Full:
+                continue
+        with self._lock:
+            self._routed[shard] += 1
+
+    def close(self, timeout=30):
+        """Let every worker finish its queue, then wait for it to exit."""
+        for queue, process in zip(self.queues, self.processes):
+            if not process.is_alive():
+                logger.warning("%s is not running, not stopping it", process.name)
+                continue
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("%s did not stop, terminating it", process.name)
+                process.terminate()
+
+    def stats(self):
+        with self._lock:
+            routed = list(self._routed)
+            restarts = self._restarts
+        stats = {
+            "routed": sum(routed),
+            "restarts": restarts,
+            "alive": sum(process.is_alive() for process in self.processes),
+        }
+        for shard, count in enumerate(routed):
+            stats[f"routed_{shard}"] = count
+            stats[f"queue_depth_{shard}"] = self.queues[shard].qsize()
+        return stats
+
+    def _start(self, shard):
+        process = self._context.Process(
+            target=self._target,
+            args=(shard, self.queues[shard]),
+            name=f"shard-{shard}",
+        )
+        process.start()
+        return process
+
+    def _revive(self, shard):
+        process = self.processes[shard]
+        if process.is_alive():
+            return
+        logger.error(
+            "%s exited with code %s, restarting it", process.name, process.exitcode
+        )
+        self.processes[shard] = self._start(shard)
+        with self._lock:
+            self._restarts += 1
+
+
+def serve(updater, updates):
+    """Dispatch the updates read from ``updates`` until the ingress sends None.
+
+    Runs in a worker process in place of polling or a webhook. Signals are
+    left to the ingress process, which drains and stops every worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    dispatcher = updater.dispatcher
+    ready = threading.Event()
+    thread = threading.Thread(
+        target=dispatcher.start, kwargs={"ready": ready}, name="dispatcher"
+    )
+    thread.start()
+    ready.wait()
+    updater.job_queue.start()
+
+    while (data := updates.get()) is not None:
+        dispatcher.update_queue.put(Update.de_json(data, updater.bot))
+
+    # Stopping lets the dispatcher finish the updates it already has
+    updater.stop()
+    thread.join()
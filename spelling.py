@@ -0,0 +1,387 @@
+import heapq
+import struct
+from bisect import bisect_left
+from collections.abc import Sequence
+from functools import lru_cache
+
+import numpy as np
+
+from lexicon import load_lexicon
+
+
+def bigrams(word):
+    return frozenset(word[i : i + 2] for i in range(len(word) - 1))
+
+
+def jaccard(a, b):
+    union = len(a | b)
+    return (union - len(a & b)) / union if union else 0.0
+
+
+class JaccardCorrector:
+    """Nearest dictionary word by bigram Jaccard distance.
+
+    Dictionary words are indexed by first letter, bigram count and bigram, so a
+    lookup only scores words that share at least one bigram with the typo, and
+    whole length buckets are skipped once they cannot beat the current best.
+    Results (and tie-breaking) match sorting every same-letter candidate by
+    ``(jaccard_distance, word)``.
+    """
+
+    def __init__(self, words):
+        self.words = tuple(words)
+        postings = {}
+        by_first = {}
+        for i, w in enumerate(self.words):
+            if not w:
+                continue
+            by_first.setdefault(w[0], []).append(w)
+            grams = bigrams(w)
+            if not grams:
+                continue
+            bucket = postings.setdefault((w[0], len(grams)), {})
+            for g in grams:
+                bucket.setdefault(g, []).append(i)
+
+        self._postings = {
+            key: {g: tuple(ids) for g, ids in bucket.items()}
+            for key, bucket in postings.items()
+        }
+        self._sizes = {}
+        for first, size in self._postings:
+            self._sizes.setdefault(first, []).append(size)
+        self._by_first = {first: tuple(sorted(ws)) for first, ws in by_first.items()}
+
+    @classmethod
+    def from_artifact(cls, lexicon):
+        """Serve the index straight from a ``MappedLexicon``'s artifact."""
+        artifact = lexicon.artifact
+        keys = artifact.array("jaccard.keys", "Q")
+        starts = artifact.array("jaccard.starts")
+        ids = artifact.array("jaccard.ids")
+        order = artifact.array("jaccard.order")
+
+        self = cls.__new__(cls)
+        self.words = lexicon.words
+        self._postings = {}
+        self._sizes = {}
+        buckets = artifact.array("jaccard.buckets")
+        for i in range(0, len(buckets), 4):
+            first, size, lo, hi = buckets[i : i + 4]
+            first = chr(first)
+            self._postings[(first, size)] = _MappedPostings(keys, starts, ids, lo, hi)
+            self._sizes.setdefault(first, []).append(size)
+        self._by_first = {}
+        firsts = artifact.array("jaccard.first")
+        for i in range(0, len(firsts), 3):
+            first, lo, hi = firsts[i : i + 3]
+            self._by_first[chr(first)] = _Subset(self.words, order[lo:hi])
+        return self
+
+    def sections(self):
+        """The artifact sections ``from_artifact`` reads."""
+        ids_by_word = {}
+        for i, w in enumerate(self.words):
+            ids_by_word.setdefault(w, i)
+
+        buckets, keys, starts, ids = [], [], [0], []
+        for first, size in sorted(self._postings, key=lambda k: (ord(k[0]), k[1])):
+            postings = self._postings[(first, size)]
+            lo = len(keys)
+            for key, g in sorted((_gram_key(g), g) for g in postings):
+                keys.append(key)
+                ids.extend(postings[g])
+                starts.append(len(ids))
+            buckets += (ord(first), size, lo, len(keys))
+
+        firsts, order = [], []
+        for first in sorted(self._by_first, key=ord):
+            lo = len(order)
+            order.extend(ids_by_word[w] for w in self._by_first[first])
+            firsts += (ord(first), lo, len(order))
+
+        def pack(fmt, values):
+            return struct.pack(f"<{len(values)}{fmt}", *values)
+
+        return {
+            "jaccard.buckets": pack("I", buckets),
+            "jaccard.keys": pack("Q", keys),
+            "jaccard.starts": pack("I", starts),
+            "jaccard.ids": pack("I", ids),
+            "jaccard.first": pack("I", firsts),
+            "jaccard.order": pack("I", order),
+        }
+
+    def correct(self, word):
+        """Return ``(score, correction)`` for the closest word, or None."""
+        best = self.suggestions(word, 1)
+        return best[0] if best else None
+
+    def correct_many(self, words):
+        return [self.correct(word) for word in words]
+
+    def suggestions(self, word, k=5):
+        """Return the ``k`` closest ``(score, word)`` pairs, closest first."""
+        if not word or word[0] not in self._by_first:
+            return []
+
+        first = word[0]
+        grams = bigrams(word)
+        a = len(grams)
+        results = []
+
+        if a:
+            # Lower bound of the distance for a bucket is reached when every
+            # bigram of the smaller set is shared
+            buckets = sorted(
+                ((max(a, b) - min(a, b)) / max(a, b), b) for b in self._sizes[first]
+            )
+            for bound, b in buckets:
+                # results is sorted here, so its last score is the one to beat
+                limit = results[-1][0] if len(results) == k else 1.0
+                if bound > limit:
+                    break
+                postings = self._postings[(first, b)]
+                shared = {}
+                for g in grams:
+                    for i in postings.get(g, ()):
+                        shared[i] = shared.get(i, 0) + 1
+                for i, n in shared.items():
+                    union = a + b - n
+                    score = (union - n) / union
+                    if score <= limit:
+                        results.append((score, self.words[i]))
+                results = heapq.nsmallest(k, results)
+
+        if len(results) < k:
+            # Words sharing no bigram are all at distance 1.0, ordered by spelling
+            seen = {w for _, w in results}
+            for w in self._by_first[first]:
+                if len(results) == k:
+                    break
+                if w not in seen:
+                    results.append((1.0, w))
+                    seen.add(w)
+
+        return results
+
+
+def _gram_key(gram):
+    return ord(gram[0]) << 32 | ord(gram[1])
+
+
+class _MappedPostings:
+    """One ``(first letter, bigram count)`` bucket of an artifact's postings.
+
+    Keys are the bucket's bigrams packed into sorted ``uint64``s, so a lookup
+    is a bisect over the mapped array and returns a zero-copy id slice.
+    """
+
+    __slots__ = ("_keys", "_starts", "_ids", "_lo", "_hi")
+
+    def __init__(self, keys, starts, ids, lo, hi):
+        self._keys = keys
+        self._starts = starts
+        self._ids = ids
+        self._lo = lo
+        self._hi = hi
+
+    def get(self, gram, default=None):
+        key = _gram_key(gram)
+        i = bisect_left(self._keys, key, self._lo, self._hi)
+        if i == self._hi or self._keys[i] != key:
+            return default
+        return self._ids[self._starts[i] : self._starts[i + 1]]
+
+
+class _Subset(Sequence):
+    __slots__ = ("_words", "_ids")
+
+    def __init__(self, words, ids):
+        self._words = words
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        return self._words[self._ids[i]]
+
+
+@lru_cache(maxsize=None)
+def load_corrector():
+    """Build the shared correction index once per process.
+
+    The index is mapped from the lexicon artifact when it carries one.
+    """
+    lexicon = load_lexicon()
+    if lexicon.artifact is not None and "jaccard.keys" in lexicon.artifact:
+        return JaccardCorrector.from_artifact(lexicon)
+    return JaccardCorrector(lexicon)
+
+
+def deletes(word, max_distance):
+    """Every string reachable from ``word`` by up to ``max_distance`` deletions."""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+class SymSpellCorrector:
+    """Symmetric-delete correction with a bounded Levenshtein distance.
+
+    Every dictionary word is indexed under all deletions of its prefix, so a
+    lookup only has to generate the deletions of the typo and verify the few
+    words they point at with ``edit_distance``. Suggestions are ranked by edit
+    distance, then bigram Jaccard distance, then spelling, and the score
+    reported is the Jaccard distance so typo tuples rank the same way for
+    either backend.
+    """
+
+    def __init__(self, words, max_distance=2, prefix_length=7):
+        # nltk is only needed by this backend, so keep it out of cold starts
+        from nltk.metrics.distance import edit_distance
+
+        self._edit_distance = edit_distance
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        index = {}
+        for w in dict.fromkeys(w.casefold() for w in words):
+            for d in deletes(w[:prefix_length], max_distance):
+                index.setdefault(d, []).append(w)
+        self._index = {d: tuple(ws) for d, ws in index.items()}
+
+    def correct(self, word):
+        """Return ``(score, correction)`` for the closest word, or None."""
+        best = self.suggestions(word, 1)
+        return best[0] if best else None
+
+    def correct_many(self, words):
+        return [self.correct(word) for word in words]
+
+    def suggestions(self, word, k=5):
+        """Return up to ``k`` ``(score, word)`` pairs, closest first."""
+        word = word.casefold()
+        grams = bigrams(word)
+        ranked = []
+        seen = set()
+        for d in deletes(word[: self.prefix_length], self.max_distance):
+            for w in self._index.get(d, ()):
+                if w in seen or abs(len(w) - len(word)) > self.max_distance:
+                    continue
+                seen.add(w)
+                distance = self._edit_distance(word, w)
+                if distance <= self.max_distance:
+                    ranked.append((distance, jaccard(grams, bigrams(w)), w))
+        return [(score, w) for _, score, w in heapq.nsmallest(k, ranked)]
+
+
+@lru_cache(maxsize=None)
+def load_symspell_corrector():
+    """Build the shared symmetric-delete index once per process."""
+    return SymSpellCorrector(load_lexicon())
+
+
+class _Block:
+    __slots__ = ("words", "sizes", "postings")
+
+    def __init__(self, words):
+        self.words = tuple(sorted(words))
+        self.sizes = np.empty(len(self.words), dtype=np.int64)
+        postings = {}
+        for i, w in enumerate(self.words):
+            grams = bigrams(w)
+            self.sizes[i] = len(grams)
+            for g in grams:
+                postings.setdefault(g, []).append(i)
+        self.postings = {
+            g: np.array(ids, dtype=np.int64) for g, ids in postings.items()
+        }
+
+
+class VectorJaccardCorrector:
+    """Jaccard correction for whole batches of typos at once with NumPy.
+
+    Each first letter's words form a bigram bitmap, one row per word in
+    alphabetical order, stored sparsely as per-bigram postings. For a batch,
+    the intersections of every typo with every candidate row come from a
+    single ``bincount`` over the typos' postings laid end to end; unions,
+    distances and each typo's best row are then segment-wise array
+    operations. Results, ties included, match ``JaccardCorrector.correct``.
+    """
+
+    def __init__(self, words):
+        by_first = {}
+        for w in dict.fromkeys(words):
+            if w:
+                by_first.setdefault(w[0], []).append(w)
+        self._blocks = {first: _Block(ws) for first, ws in by_first.items()}
+
+    def correct(self, word):
+        """Return ``(score, correction)`` for the closest word, or None."""
+        return self.correct_many([word])[0]
+
+    def correct_many(self, words):
+        results = [None] * len(words)
+        segments = []  # (result index, block, typo bigram count)
+        hits = []
+        offset = 0
+        for i, word in enumerate(words):
+            block = self._blocks.get(word[:1])
+            if block is None:
+                continue
+            grams = bigrams(word)
+            if not grams:
+                results[i] = (1.0, block.words[0])
+                continue
+            for g in grams:
+                ids = block.postings.get(g)
+                if ids is not None:
+                    hits.append(ids + offset)
+            segments.append((i, block, len(grams)))
+            offset += len(block.words)
+        if not segments:
+            return results
+
+        shared = np.bincount(
+            np.concatenate(hits) if hits else np.empty(0, dtype=np.int64),
+            minlength=offset,
+        )
+        lengths = [len(block.words) for _, block, _ in segments]
+        starts = np.cumsum([0] + lengths[:-1])
+        union = np.repeat([a for _, _, a in segments], lengths)
+        union += np.concatenate([block.sizes for _, block, _ in segments])
+        union -= shared
+        distance = (union - shared) / union
+
+        # First (alphabetically smallest) row reaching each segment's minimum
+        best = np.minimum.reduceat(distance, starts)
+        at_best = np.flatnonzero(distance == np.repeat(best, lengths))
+        rows = at_best[np.searchsorted(at_best, starts)] - starts
+        for (i, block, _), score, row in zip(segments, best.tolist(), rows.tolist()):
+            results[i] = (score, block.words[row])
+        return results
+
+
+@lru_cache(maxsize=None)
+def load_vector_corrector():
+    """Build the shared batch scoring matrices once per process."""
+    return VectorJaccardCorrector(load_lexicon())
+
+
+BACKENDS = {
+    "jaccard": load_corrector,
+    "symspell": load_symspell_corrector,
+    "vector": load_vector_corrector,
+}
+
+
+def get_corrector(backend="jaccard"):
+    """Return the shared corrector for a backend name from ``BACKENDS``."""
+    try:
+        return BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown spelling backend: {backend}") from None
@@ -0,0 +1,88 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from spelling import get_corrector
+
+logger = logging.getLogger(__name__)
+
+
+def _load(backends):
+    for backend in backends:
+        get_corrector(backend)
+
+
+def _correct(backend, words):
+    return get_corrector(backend).correct_many(words)
+
+
+class CorrectionPool:
+    """Runs spelling correction in worker processes that keep the index loaded.
+
+    Workers are started once, from a forkserver since the parent already
+    runs threads, and each builds ``backends`` from the mapped lexicon.
+    At most ``max_pending`` batches may be queued; callers that find the
+    queue full, or whose batch misses ``timeout``, get None for every word
+    and should only count the typos.
+    """
+
+    def __init__(self, workers, max_pending=64, timeout=2.0, backends=("jaccard",)):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        _load(backends)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_load,
+            initargs=(tuple(backends),),
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "rejected": 0, "timeouts": 0, "pending": 0}
+
+        # Start every worker now, so no request pays for the index build
+        for future in [self._executor.submit(_load, ()) for _ in range(workers)]:
+            future.result()
+
+    def submit(self, backend, words):
+        """Return a future for ``words``' corrections, or None if the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return None
+        self._count("submitted")
+        self._count("pending")
+        future = self._executor.submit(_correct, backend, list(words))
+        future.add_done_callback(self._release)
+        return future
+
+    def correct(self, backend, words):
+        """Corrections for ``words``, with None for any that could not be made in time."""
+        future = self.submit(backend, words)
+        if future is None:
+            return [None] * len(words)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            self._count("timeouts")
+        except Exception:
+            logger.exception("Spelling correction failed in worker")
+        return [None] * len(words)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters, workers=self.workers, max_pending=self.max_pending
+            )
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _release(self, future):
+        self._count("pending", -1)
+        self._slots.release()
@@ -18,34 +18,30 @@ from telegram.ext import (
     CallbackQueryHandler,
     InlineQueryHandler,
 )
-from nltk import download
-from nltk.corpus import words
-from nltk.metrics.distance import (
-    edit_distance,
-    jaccard_distance,
-)
-from nltk.util import ngrams
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud, STOPWORDS
 
+import io
 import os
+from collections import Counter
 from dotenv import load_dotenv
+from lexicon import load_lexicon
+from spelling import get_corrector
+from tokenizer import tokenize
+from typo_stats import TypoStats
+from leaderboard import Leaderboard
+import ingress
+from word_clouds import WordCloudRenderer
 
 load_dotenv("./.env")
 TOKEN = os.getenv("token")
+SPELLING_BACKEND = os.getenv("spelling_backend", "jaccard")
+WORKERS = int(os.getenv("workers", 4))
 bot = Bot(TOKEN)
 
-download("words")  # run this in the first run
-correct_spellings = words.words()
+correct_spellings = load_lexicon()
+corrector = get_corrector(SPELLING_BACKEND)
 
 typos = {}
-
-
-def plot_cloud(wordcloud):
-    plt.figure(figsize=(40, 30))
-    plt.imshow(wordcloud)
-    plt.axis("off")
-    plt.savefig("word_cloud.png")
+word_cloud_renderer = None  # started by main()
 
 
 def show(update: Update, context: CallbackContext):
@@ -54,56 +50,34 @@ def show(update: Update, context: CallbackContext):
 
 def word_cloud(update: Update, context: CallbackContext):
     typos = context.chat_data["typos"]
-    typo_words = []
-    for typo in typos:
-        typo_words.append(typo[1])
+    typo_words = Counter()
+    for user_typos in typos.values():
+        typo_words.update(user_typos.words)
 
     # convo handler? maybe can ask what colour they want
-    wordcloud = WordCloud(
-        width=3000,
-        height=2000,
-        random_state=1,
-        background_color="salmon",
-        colormap="Pastel1",
-        collocations=False,
-    ).generate(" ".join(typo_words))
-    plot_cloud(wordcloud)
-    img = open("word_cloud.png", "rb")
-    update.message.reply_photo(img)  ##dk how to send the file
+    image = word_cloud_renderer.render(typo_words).result()
+    update.message.reply_photo(io.BytesIO(image))
+
 
 def typo_msg(update: Update, context: CallbackContext):
-    punc = '''!()-[]{};:'"\,<>./?@#$%^&*_~'''
-    text = update.message.text
     user = update.effective_user
+    if user not in typos:
+        typos[user] = TypoStats()
 
-    # Removing punctuations in string
-    # Using loop + punctuation string
-    for ele in text:
-        if ele in punc:
-            text = text.replace(ele, "")
-    list_words = text.split()
     count = 0
-
-    count = 0
-    for word in list_words:
+    for word, isalpha in tokenize(update.message.text):
         if word not in correct_spellings:
             count += 1
-            candidates = [
-                (jaccard_distance(set(ngrams(word, 2)), set(ngrams(w, 2))), w)
-                for w in correct_spellings
-                if w[0] == word[0]
-            ]
-            if len(candidates) != 0:
-                correction = sorted(candidates)[
-                    0
-                ]  # gets most similar word based on jaccard distance
-                if user not in typos:
-                    typos[user] = [(correction[0], word)]
-                else:
-                    typos[user].append((correction[0], word))
-                    # adds jaccard score and original typo into list
+            correction = corrector.correct(
+                word
+            )  # gets most similar word based on jaccard distance
+            typos[user].record(word, correction[0] if correction else None)
+            # adds jaccard score and original typo
 
     context.chat_data["typos"] = typos  # saves typos and scores into list
+    if count:
+        leaderboard = context.chat_data.setdefault("leaderboard", Leaderboard())
+        leaderboard.add(user.id, count, user.first_name)
 
     if count == 1:  # if there are errors
         update.message.reply_text(
@@ -114,30 +88,31 @@ def typo_msg(update: Update, context: CallbackContext):
             f"Your reply contained {str(count)} typo errors! Are you even trying?"
         )
     if (
-        len(typos[user]) > 10
+        typos[user].today() > 10
     ):  # triggered when more than 10 errors, replies with worst jaccard score (i.e. 1)
-        typos[user].sort(key=lambda x: x[1])
-        worst_spelt = typos[user][-1][1]
+        worst_spelt = typos[user].worst_spelt()
         update.message.reply_text(
             f"Someone made more than 10 typos today... Your worstly spelt word is {worst_spelt}"
         )
 
 def get_highest_typo(update: Update, context: CallbackContext):
-    typos = context.chat_data['typos']
-    users =  list(typos.keys())
-    max_typo = 0
-    user_most_typos = ''
-    for user in users:
-        num_typos = len(typos[user])
-        if num_typos > max_typo:
-            max_typo = len(typos[user])
-            user_most_typos = user
-    update.message.reply_text(f"{user} has the most typos with {str(max_typo)} typos so far!")
+    leaderboard = context.chat_data.get("leaderboard")
+    leader = leaderboard.leader() if leaderboard else None
+    if leader is None:
+        update.message.reply_text("No typos so far!")
+        return
+    user_most_typos, max_typo = leader
+    update.message.reply_text(
+        f"{leaderboard.name(user_most_typos)} has the most typos with {str(max_typo)} typos so far!"
+    )
 
 
 
 def main():
-    updater = Updater(TOKEN, use_context=True)
+    global word_cloud_renderer
+    word_cloud_renderer = WordCloudRenderer()
+
+    updater = Updater(TOKEN, use_context=True, workers=WORKERS)
 
     # Get dispatcher to register handlers
     dp = updater.dispatcher
@@ -149,7 +124,7 @@ def main():
     # dp.add_handler(InlineQueryHandler(inline_price))
     # dp.add_error_handler(error)
 
-    updater.start_polling()
+    ingress.start(updater)
     updater.idle()
 
 
@@ -0,0 +1,179 @@
+"""Tests for memes.MemeClient against a local stand-in for the imgflip API.
+
+    python -m pytest test_memes.py
+"""
+
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from memes import MemeClient, MemeError
+
+TEMPLATES = [{"id": "181913649", "name": "Drake Hotline Bling"}]
+
+
+class FakeImgflip:
+    """Answers ``get_memes`` and ``caption_image`` with canned responses.
+
+    ``responses`` maps a method to a list of ``(status, body)`` pairs served
+    in turn, the last one repeating; ``calls`` counts requests per method and
+    ``params`` keeps the query of the last ``caption_image``.
+    """
+
+    def __init__(self):
+        self.responses = {
+            "get_memes": [(200, {"success": True, "data": {"memes": TEMPLATES}})],
+            "caption_image": [
+                (200, {"success": True, "data": {"url": "https://i.imgflip.com/1.jpg"}})
+            ],
+        }
+        self.calls = {}
+        self.params = None
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, method, query):
+        with self._lock:
+            count = self.calls[method] = self.calls.get(method, 0) + 1
+            if method == "caption_image":
+                self.params = dict(parse_qsl(query))
+            responses = self.responses[method]
+            return responses[min(count, len(responses)) - 1]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                url = urlsplit(self.path)
+                method = url.path.strip("/")
+                if method not in fake.responses:
+                    self.send_error(404)
+                    return
+                status, body = fake._respond(method, url.query)
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _serve
+
+        return Handler
+
+
+class MemeClientTest(unittest.TestCase):
+    def setUp(self):
+        self.imgflip = FakeImgflip()
+        self.client = MemeClient(
+            "user", "secret", base_url=self.imgflip.base_url, timeout=5
+        )
+
+    def tearDown(self):
+        self.client.session.close()
+        self.imgflip.close()
+
+    def test_caption_returns_the_image_url(self):
+        url = self.client.caption("top", "bottom")
+
+        self.assertEqual(url, "https://i.imgflip.com/1.jpg")
+        self.assertEqual(
+            self.imgflip.params,
+            {
+                "username": "user",
+                "password": "secret",
+                "template_id": "181913649",
+                "text0": "top",
+                "text1": "bottom",
+            },
+        )
+
+    def test_catalog_is_fetched_once(self):
+        for _ in range(3):
+            self.client.caption("top", "bottom")
+
+        self.assertEqual(self.imgflip.calls, {"get_memes": 1, "caption_image": 3})
+
+    def test_given_template_skips_the_catalog(self):
+        self.client.caption("top", "bottom", template_id="61579")
+
+        self.assertNotIn("get_memes", self.imgflip.calls)
+        self.assertEqual(self.imgflip.params["template_id"], "61579")
+
+    def test_stale_catalog_is_served_while_refreshing(self):
+        self.client.ttl = 0
+        self.client.templates()
+        newer = [{"id": "87743020", "name": "Two Buttons"}]
+        self.imgflip.responses["get_memes"] = [
+            (200, {"success": True, "data": {"memes": newer}})
+        ]
+
+        self.assertEqual(self.client.templates(), TEMPLATES)
+        deadline = time.monotonic() + 5
+        while self.client.templates() != newer and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.client.templates(), newer)
+
+    def test_server_errors_are_retried(self):
+        self.imgflip.responses["caption_image"].insert(0, (503, {}))
+
+        self.assertEqual(self.client.caption("top", "bottom"), "https://i.imgflip.com/1.jpg")
+        self.assertEqual(self.imgflip.calls["caption_image"], 2)
+
+    def test_failed_caption_raises_meme_error(self):
+        self.imgflip.responses["caption_image"] = [
+            (200, {"success": False, "error_message": "No texts specified."})
+        ]
+
+        with self.assertRaisesRegex(MemeError, "No texts specified"):
+            self.client.caption("", "")
+
+    def test_empty_catalog_raises_meme_error(self):
+        self.imgflip.responses["get_memes"] = [
+            (200, {"success": True, "data": {"memes": []}})
+        ]
+
+        with self.assertRaises(MemeError):
+            self.client.caption("top", "bottom")
+        self.assertNotIn("caption_image", self.imgflip.calls)
+
+    def test_unexpected_catalog_raises_meme_error(self):
+        for body in ({"success": True}, {"data": None}, [], "down for maintenance"):
+            with self.subTest(body=body):
+                self.imgflip.responses["get_memes"] = [(200, body)]
+                with self.assertRaises(MemeError):
+                    self.client.caption("top", "bottom")
+
+    def test_template_without_id_raises_meme_error(self):
+        self.imgflip.responses["get_memes"] = [
+            (200, {"success": True, "data": {"memes": [{"name": "No id"}]}})
+        ]
+
+        with self.assertRaises(MemeError):
+            self.client.caption("top", "bottom")
+
+    def test_unexpected_caption_response_raises_meme_error(self):
+        for body in ({"success": True}, {"success": True, "data": []}, ["ok"]):
+            with self.subTest(body=body):
+                self.imgflip.responses["caption_image"] = [(200, body)]
+                with self.assertRaises(MemeError):
+                    self.client.caption("top", "bottom")
+
+
+if __name__ == "__main__":
+    unittest.main()
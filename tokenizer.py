@@ -0,0 +1,17 @@
+from collections import namedtuple
+
+PUNCTUATION = """!()-[]{};:'"\\,<>./?@#$%^&*_~"""
+
+_STRIP_PUNCTUATION = str.maketrans("", "", PUNCTUATION)
+
+Token = namedtuple("Token", ["word", "isalpha"])
+
+
+def normalize(text):
+    """Lowercase ``text`` and drop punctuation in a single pass."""
+    return text.lower().translate(_STRIP_PUNCTUATION)
+
+
+def tokenize(text):
+    """Split a message into ``Token(word, isalpha)`` pairs for the detectors."""
+    return [Token(word, word.isalpha()) for word in normalize(text).split()]
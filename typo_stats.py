@@ -0,0 +1,86 @@
+import heapq
+import time
+
+WINDOW_HOURS = 24
+
+
+def _hour(now=None):
+    return int((time.time() if now is None else now) // 3600)
+
+
+class TypoStats:
+    """Bounded typo history for one user.
+
+    Keeps a running total, the ``k`` worst distinct typos (furthest, by
+    Jaccard distance, from their correction) in a min-heap, and counts for
+    at most ``max_words`` typo words for the word cloud. When the word map
+    is full a new word replaces the rarest one and inherits its count
+    (Space-Saving), so frequent typos survive. Typos of the last 24 hours
+    are counted in a ring of hourly buckets; buckets that fall out of the
+    window are cleared whenever the ring is touched, or by ``expire``.
+    Memory stays O(k + max_words).
+    """
+
+    __slots__ = ("k", "max_words", "total", "worst", "words", "hours", "hour")
+
+    def __init__(self, k=10, max_words=200):
+        self.k = k
+        self.max_words = max_words
+        self.total = 0
+        self.worst = []  # min-heap of (score, word)
+        self.words = {}
+        self.hours = [0] * WINDOW_HOURS  # typos per hour, ring indexed by hour
+        self.hour = _hour()  # the newest hour in the ring
+
+    def __setstate__(self, state):
+        _, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+        if not hasattr(self, "hours"):
+            # Stats saved before the window existed: lifetime totals only
+            self.hours = [0] * WINDOW_HOURS
+            self.hour = _hour()
+
+    def record(self, word, score=None, now=None):
+        """Count a typo, with the Jaccard score of its correction if it had one."""
+        self.total += 1
+        hour = _hour(now)
+        self.expire(now)
+        if hour == self.hour:
+            self.hours[hour % WINDOW_HOURS] += 1
+        self._count(word)
+        if score is None or any(w == word for _, w in self.worst):
+            return
+        if len(self.worst) < self.k:
+            heapq.heappush(self.worst, (score, word))
+        elif (score, word) > self.worst[0]:
+            heapq.heapreplace(self.worst, (score, word))
+
+    def today(self, now=None):
+        """Typos in the last 24 hours."""
+        self.expire(now)
+        return sum(self.hours)
+
+    def expire(self, now=None):
+        """Clear the buckets of hours that have left the window."""
+        hour = _hour(now)
+        if hour <= self.hour:
+            return
+        for stale in range(self.hour + 1, min(hour, self.hour + WINDOW_HOURS) + 1):
+            self.hours[stale % WINDOW_HOURS] = 0
+        self.hour = hour
+
+    def worst_spelt(self):
+        return max(self.worst)[1] if self.worst else None
+
+    def __len__(self):
+        return self.total
+
+    def _count(self, word):
+        if word in self.words:
+            self.words[word] += 1
+        elif len(self.words) < self.max_words:
+            self.words[word] = 1
+        else:
+            rarest = min(self.words, key=self.words.get)
+            self.words[word] = self.words.pop(rarest) + 1
@@ -0,0 +1,91 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from cachetools import LRUCache
+from wordcloud import WordCloud
+
+logger = logging.getLogger(__name__)
+
+
+def render_word_cloud(text, width, height):
+    """Render ``text`` as a word cloud and return the PNG bytes."""
+    wordcloud = WordCloud(
+        width=width,
+        height=height,
+        random_state=1,
+        background_color="salmon",
+        colormap="Pastel1",
+        collocations=False,
+    ).generate(text)
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class WordCloudRenderer:
+    """Renders word clouds in a worker process and caches the images.
+
+    Images are keyed by a digest of the word counts, so asking again before
+    any new typo is recorded returns the cached PNG without rendering.
+    """
+
+    def __init__(self, width=3000, height=2000, workers=1, cache_size=64):
+        self.width = width
+        self.height = height
+        # Read on the dispatcher, filled from the executor's callback thread
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        # Not forked from this process, which already runs Mongo and
+        # write-behind threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+        )
+        for future in [self._executor.submit(int) for _ in range(workers)]:
+            future.result()
+
+    def render(self, counts):
+        """Return a future for the PNG bytes of a cloud of ``{word: count}``."""
+        key = self._digest(counts)
+        future = Future()
+        with self._lock:
+            image = self._cache.get(key)
+        if image is not None:
+            future.set_result(image)
+            return future
+
+        text = " ".join(
+            " ".join([word] * count) for word, count in sorted(counts.items())
+        )
+        rendering = self._executor.submit(
+            render_word_cloud, text, self.width, self.height
+        )
+        rendering.add_done_callback(lambda done: self._finish(key, done, future))
+        return future
+
+    def cached(self, counts):
+        key = self._digest(counts)
+        with self._lock:
+            return key in self._cache
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def _digest(self, counts):
+        digest = hashlib.sha1(f"{self.width}x{self.height}".encode())
+        for word, count in sorted(counts.items()):
+            digest.update(f"\0{word}\0{count}".encode())
+        return digest.hexdigest()
+
+    def _finish(self, key, rendering, future):
+        try:
+            image = rendering.result()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._cache[key] = image
+        future.set_result(image)
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Write errors that retrying the same update cannot fix: duplicate key,
+# document validation, bad values and types, immutable or conflicting fields
+PERMANENT_ERRORS = frozenset({2, 9, 14, 52, 66, 121, 11000, 11001, 40})
+
+
+class WriteBehind:
+    """Buffers ``$set`` and ``$inc`` updates and writes them with bulk_write.
+
+    Updates for the same document (by chat id, or by any key for ``inc``) in
+    the same collection are merged while they wait, so a burst of writes for
+    one chat costs a single round-trip. The buffer is flushed from a
+    background thread every ``interval`` seconds, or as soon as
+    ``max_pending`` documents are waiting, and drained by ``close``.
+
+    When some updates of a bulk write fail, the rest have been applied, so
+    only the failed ones are queued again. An update the server rejects for
+    good, or that fails ``max_attempts`` times, is logged and dropped.
+    """
+
+    def __init__(self, max_pending=100, interval=1.0, max_attempts=5):
+        self.max_pending = max_pending
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._collections = {}
+        self._attempts = {}  # pending key -> failed writes so far
+        self._pending = {}  # (collection name, key items) -> update operators
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._counters = {
+            "updates": 0,
+            "coalesced": 0,
+            "written": 0,
+            "flushes": 0,
+            "errors": 0,
+            "dropped": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+        self._thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def set(self, collection, chat_id, fields):
+        """Queue ``{"$set": fields}`` for the chat's document in ``collection``."""
+        self._queue(collection, {"chatid": chat_id}, {"$set": fields})
+
+    def inc(self, collection, key, fields, set_fields=None):
+        """Queue ``{"$inc": fields}`` for the document matching ``key``.
+
+        ``set_fields`` are ``$set`` on the same document, the latest winning.
+        """
+        self._queue(collection, key, {"$inc": fields, "$set": set_fields or {}})
+
+    def _queue(self, collection, key, update):
+        pending_key = (collection.name, tuple(sorted(key.items())))
+        with self._lock:
+            self._collections[collection.name] = collection
+            self._counters["updates"] += 1
+            if pending_key in self._pending:
+                _merge(self._pending[pending_key], update)
+                self._counters["coalesced"] += 1
+            else:
+                self._pending[pending_key] = _merge({}, update)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything queued so far."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            start = time.perf_counter()
+            batches = {}
+            for (name, key), update in pending.items():
+                batches.setdefault(name, []).append((key, update))
+
+            written = errors = 0
+            for name, updates in batches.items():
+                requests = [
+                    UpdateOne(
+                        dict(key), {op: f for op, f in update.items() if f}, upsert=True
+                    )
+                    for key, update in updates
+                ]
+                try:
+                    self._collections[name].bulk_write(requests, ordered=False)
+                    written += len(requests)
+                    failed = []
+                except BulkWriteError as e:
+                    # The other updates were applied and must not be repeated
+                    write_errors = e.details.get("writeErrors", [])
+                    logger.error(
+                        "Failed to write %d of %d updates to %s: %s",
+                        len(write_errors),
+                        len(requests),
+                        name,
+                        write_errors[:1],
+                    )
+                    errors += 1
+                    written += len(requests) - len(write_errors)
+                    failed = [
+                        (updates[error["index"]], error.get("code"))
+                        for error in write_errors
+                    ]
+                except PyMongoError:
+                    logger.exception(
+                        "Failed to write %d updates to %s", len(requests), name
+                    )
+                    errors += 1
+                    failed = [(update, None) for update in updates]
+                self._retry(name, updates, failed)
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                counters = self._counters
+                counters["written"] += written
+                counters["errors"] += errors
+                counters["flushes"] += 1
+                counters["last_flush_seconds"] = elapsed
+                counters["total_flush_seconds"] += elapsed
+                counters["max_flush_seconds"] = max(
+                    counters["max_flush_seconds"], elapsed
+                )
+
+    def stats(self):
+        """Snapshot of the queue depth and flush counters."""
+        with self._lock:
+            return dict(self._counters, queue_depth=len(self._pending))
+
+    def close(self):
+        """Stop the flush thread and drain whatever is still queued."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def _retry(self, name, updates, failed):
+        with self._lock:
+            retried = set()
+            for (key, update), code in failed:
+                pending_key = (name, key)
+                attempts = self._attempts.get(pending_key, 0) + 1
+                if code in PERMANENT_ERRORS or attempts >= self.max_attempts:
+                    logger.error(
+                        "Dropping update %s of %s after %d attempts (code %s)",
+                        update,
+                        pending_key,
+                        attempts,
+                        code,
+                    )
+                    self._attempts.pop(pending_key, None)
+                    self._counters["dropped"] += 1
+                    continue
+                # Anything $set since the failed flush is newer and wins
+                newer = self._pending.get(pending_key, {})
+                self._pending[pending_key] = _merge(update, newer)
+                self._attempts[pending_key] = attempts
+                retried.add(pending_key)
+            for key, _ in updates:
+                if (name, key) not in retried:
+                    self._attempts.pop((name, key), None)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+
+def _merge(update, newer):
+    """Fold ``newer`` into ``update``: ``$set`` overwrites, ``$inc`` adds up."""
+    for field, value in newer.get("$set", {}).items():
+        update.setdefault("$set", {})[field] = value
+    increments = update.setdefault("$inc", {})
+    for field, value in newer.get("$inc", {}).items():
+        increments[field] = increments.get(field, 0) + value
+    return update